@@ -0,0 +1,296 @@
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Benchmark de punta a punta de NotificationSystem sobre datos sintéticos.
+# Las bases se generan como archivos SQLite con los mismos nombres y esquemas
+# que las bases Access (cor*.mdb y 4- EMPRESAS CORDOBA.mdb) y se leen con
+# DB_BACKEND=sqlite. Los envíos usan transportes falsos de SMTP y WhatsApp.
+#
+#   python benchmark.py --filas 10000 100000 1000000 --salida bench.json
+
+EMPRESAS_DB = '4- EMPRESAS CORDOBA.mdb'
+
+
+def generate_dataset(data_dir, n_actas, n_empresas, n_files=10, seed=42, today=None):
+    rng = np.random.default_rng(seed)
+    today = np.datetime64(today or date.today(), 'D')
+    os.makedirs(data_dir, exist_ok=True)
+
+    # Empresas: CUIT de 11 dígitos, email y teléfonos en formatos variados
+    cuits = 20_000_000_000 + rng.choice(10_000_000_000, size=n_empresas, replace=False)
+    idx = np.arange(n_empresas)
+    emails = pd.Series([f'contacto{i}@empresa{i}.com.ar' for i in idx], dtype=object)
+    emails[rng.random(n_empresas) < 0.15] = None
+    emails[rng.random(n_empresas) < 0.02] = 'sin-email'
+
+    def phones(missing):
+        numbers = rng.integers(1_000_000, 9_999_999, size=n_empresas)
+        formats = rng.integers(0, 5, size=n_empresas)
+        values = []
+        for number, fmt in zip(numbers, formats):
+            if fmt == 0:
+                values.append(f'0351-4{number % 1_000_000:06d}')
+            elif fmt == 1:
+                values.append(f'(0351) 15-{number}')
+            elif fmt == 2:
+                values.append(f'+54 9 351 {number}')
+            elif fmt == 3:
+                values.append(f'351{number}')
+            else:
+                values.append(str(number % 100_000))  # número incompleto
+        values = pd.Series(values, dtype=object)
+        values[rng.random(n_empresas) < missing] = None
+        return values
+
+    empresas = pd.DataFrame({
+        'CUIT': cuits,
+        'EMAIL': emails,
+        'TEL_DOM_LEGAL': phones(0.3),
+        'TEL_DOM_REAL': phones(0.6),
+    })
+
+    # Actas: pocas empresas concentran muchas actas; ~10% de CUIT sin empresa
+    weights = 1.0 / np.arange(1, n_empresas + 1) ** 0.8
+    owners = rng.choice(n_empresas, size=n_actas, p=weights / weights.sum())
+    acta_cuits = cuits[owners]
+    unknown = rng.random(n_actas) < 0.10
+    acta_cuits[unknown] = 30_000_000_000 + rng.integers(0, 1_000_000_000, size=unknown.sum())
+
+    offsets = rng.integers(-180, 90, size=n_actas)
+    # Garantizar avisos del día: vencimientos en 2 días y vencidos hace 20
+    kind = rng.random(n_actas)
+    offsets[kind < 0.02] = 2
+    offsets[(kind >= 0.02) & (kind < 0.04)] = -20
+    vencimientos = (today + offsets.astype('timedelta64[D]')).astype('datetime64[ns]')
+
+    totals = np.round(rng.lognormal(11, 1.2, size=n_actas), 2)
+    totals[rng.random(n_actas) < 0.03] = 0
+
+    actas = pd.DataFrame({
+        'NRO_ACTA': np.arange(1, n_actas + 1) + 100_000,
+        'RAZON_SOCIAL': pd.Series([f'EMPRESA {o} S.A.' for o in owners], dtype=object),
+        'FECHA_PAGO_OBL': vencimientos,
+        'TOTALDEUDAACTUALIZADA': totals,
+        'CUIT': acta_cuits,
+    })
+
+    for i, chunk in enumerate(np.array_split(np.arange(n_actas), n_files)):
+        path = os.path.join(data_dir, f'cor{i:03d}.mdb')
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        actas.iloc[chunk].to_sql('actas', conn, index=False)
+        conn.close()
+
+    path = os.path.join(data_dir, EMPRESAS_DB)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    empresas.to_sql('empresas', conn, index=False)
+    conn.execute('CREATE VIEW vw_EmpresasInterior AS SELECT * FROM empresas')
+    conn.commit()
+    conn.close()
+
+
+class FakeSMTP:
+    latency = 0.0
+    sent = 0
+
+    def __init__(self, host, port, timeout=None):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg):
+        if FakeSMTP.latency:
+            time.sleep(FakeSMTP.latency)
+        FakeSMTP.sent += 1
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class StageTimer:
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=0):
+        result = {'filas': rows}
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                yield result
+        finally:
+            elapsed = time.perf_counter() - start
+            result['segundos'] = round(elapsed, 6)
+            result['filas_por_segundo'] = round(result['filas'] / elapsed, 1) if elapsed else None
+            if self.trace_memory:
+                result['pico_memoria_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+                tracemalloc.stop()
+            self.stages[name] = result
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 2)
+    except ImportError:
+        return None
+
+
+def run_once(data_dir, n_actas, n_empresas, n_files, workers, smtp_latency, trace_memory, seed, digest=False,
+             streaming=False, chunk_size=50000):
+    start = time.perf_counter()
+    generate_dataset(data_dir, n_actas, n_empresas, n_files, seed)
+    generation = time.perf_counter() - start
+
+    os.chdir(data_dir)
+    os.environ.update({
+        'DB_BACKEND': 'sqlite',
+        'CACHE_MDB': '0',
+        'EXPORTAR_CSV': '0',
+        'LEDGER_FILE': os.path.join(data_dir, 'notificaciones.db'),
+        'MDB_WORKERS': str(workers),
+        'EMAIL_SENDER': 'benchmark@example.com',
+        'EMAIL_PASSWORD': 'x',
+        'MODO_RESUMEN': '1' if digest else '0',
+        'MODO_STREAMING': '1' if streaming else '0',
+        'TAMANO_CHUNK': str(chunk_size),
+        'WHATSAPP_BACKEND': 'mock',
+    })
+    for leftover in ('notificaciones.db', 'notificaciones.db-wal', 'notificaciones.db-shm'):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+    from notification_system import NotificationSystem
+
+    system = NotificationSystem()
+    FakeSMTP.latency = smtp_latency
+    FakeSMTP.sent = 0
+    system.smtp_pool.smtp_factory = FakeSMTP
+
+    timer = StageTimer(trace_memory)
+    with timer.stage('load_mdb_data') as stage:
+        df = system.load_mdb_data()
+        stage['filas'] = len(df)
+    with timer.stage('due_selection', len(df)) as stage:
+        due_today, pending = system.select_due_notifications(df)
+        stage['seleccionadas'] = len(due_today) + len(pending)
+    with timer.stage('merge', len(due_today) + len(pending)):
+        due_today = system.attach_contacts(due_today)
+        pending = system.attach_contacts(pending)
+    with timer.stage('render', len(due_today) + len(pending)):
+        due_today = system.render_due_batch(due_today)
+        pending = system.render_due_batch(pending)
+    rows = due_today.to_dict('records') + pending.to_dict('records')
+    with timer.stage('dispatch', len(rows)):
+        if system.digest_mode:
+            system.send_digest_notifications(due_today)
+            system.send_digest_notifications(pending)
+        else:
+            for row in rows:
+                system.send_notifications(row, row['ES_MORA'])
+        system.drain_outbox()
+        system.smtp_pool.close()
+        system.ledger.flush()
+    system.dispatcher.shutdown()
+
+    return {
+        'filas': n_actas,
+        'empresas': n_empresas,
+        'archivos': n_files,
+        'generacion_segundos': round(generation, 3),
+        'etapas': timer.stages,
+        'total_segundos': round(sum(s['segundos'] for s in timer.stages.values()), 6),
+        'pico_rss_mb': peak_rss_mb(),
+        'enviados': {'Email': FakeSMTP.sent, 'WhatsApp': len(system.whatsapp.sent)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de punta a punta del sistema de notificaciones')
+    parser.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--empresas', type=int, default=None, help='por defecto filas / 5')
+    parser.add_argument('--archivos', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latencia-smtp', type=float, default=0.0)
+    parser.add_argument('--tracemalloc', action='store_true', help='medir el pico de memoria por etapa')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--resumen', action='store_true', help='un mensaje por CUIT (MODO_RESUMEN=1)')
+    parser.add_argument('--streaming', action='store_true', help='lectura por bloques (MODO_STREAMING=1)')
+    parser.add_argument('--tamano-chunk', type=int, default=50000)
+    parser.add_argument('--dir', default=None, help='directorio de trabajo (por defecto uno temporal)')
+    parser.add_argument('--salida', default=None, help='archivo JSON de resultados')
+    parser.add_argument('--una-corrida', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.una_corrida:
+        n = args.filas[0]
+        result = run_once(os.path.abspath(args.dir), n, args.empresas or max(1, n // 5), args.archivos,
+                          args.workers, args.latencia_smtp, args.tracemalloc, args.seed, args.resumen,
+                          args.streaming, args.tamano_chunk)
+        print(json.dumps(result))
+        return
+
+    # Cada tamaño corre en un proceso aparte para que el pico de RSS sea independiente
+    results = []
+    base_dir = args.dir or tempfile.mkdtemp(prefix='aviso_bench_')
+    for n in args.filas:
+        data_dir = os.path.join(base_dir, str(n))
+        cmd = [sys.executable, os.path.abspath(__file__), '--una-corrida', '--filas', str(n),
+               '--archivos', str(args.archivos), '--workers', str(args.workers),
+               '--latencia-smtp', str(args.latencia_smtp), '--seed', str(args.seed), '--dir', data_dir,
+               '--tamano-chunk', str(args.tamano_chunk)]
+        if args.empresas:
+            cmd += ['--empresas', str(args.empresas)]
+        if args.tracemalloc:
+            cmd.append('--tracemalloc')
+        if args.resumen:
+            cmd.append('--resumen')
+        if args.streaming:
+            cmd.append('--streaming')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            filter(None, [os.path.dirname(os.path.abspath(__file__)), os.environ.get('PYTHONPATH')])))
+        proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            results.append({'filas': n, 'error': proc.stderr.strip().splitlines()[-1:]})
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{n} filas: {result['total_segundos']:.2f} s, pico RSS {result['pico_rss_mb']} MB", file=sys.stderr)
+
+    output = json.dumps({'fecha': date.today().isoformat(), 'corridas': results}, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
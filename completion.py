@@ -0,0 +1,59 @@
+import threading
+import pandas as pd
+
+AVISOS = ('vencimiento', 'mora')
+
+
+class CompletionTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # archivo -> (huella, avisos (acta, tipo) todavía sin registrar)
+        self.remaining = {}
+        # (acta, tipo) -> archivos que contienen el acta
+        self.owners = {}
+
+    def fingerprint(self, mdb_file):
+        with self._lock:
+            return self.remaining[mdb_file][0] if mdb_file in self.remaining else None
+
+    def track(self, mdb_file, fingerprint, actas, notified):
+        # `notified` es {tipo: actas ya registradas}; solo se guardan los avisos faltantes del archivo
+        actas = pd.Series(pd.unique(pd.Series(actas).astype(str)))
+        pending = set()
+        for aviso in AVISOS:
+            missing = actas[~actas.isin(notified.get(aviso, ()))]
+            pending.update(zip(missing, [aviso] * len(missing)))
+        with self._lock:
+            self._forget(mdb_file)
+            self.remaining[mdb_file] = (fingerprint, pending)
+            for key in pending:
+                self.owners.setdefault(key, set()).add(mdb_file)
+        return len(pending)
+
+    def _forget(self, mdb_file):
+        _, pending = self.remaining.pop(mdb_file, (None, set()))
+        for key in pending:
+            files = self.owners.get(key)
+            if files is not None:
+                files.discard(mdb_file)
+                if not files:
+                    del self.owners[key]
+
+    def forget(self, mdb_file):
+        with self._lock:
+            self._forget(mdb_file)
+
+    def mark(self, acta, aviso):
+        # Se llama al registrar cada notificación: descuenta el aviso de todos los archivos que lo contienen
+        key = (str(acta), aviso)
+        with self._lock:
+            for mdb_file in self.owners.pop(key, ()):
+                self.remaining[mdb_file][1].discard(key)
+
+    def completed(self):
+        with self._lock:
+            return [mdb_file for mdb_file, (_, pending) in self.remaining.items() if not pending]
+
+    def remaining_counts(self):
+        with self._lock:
+            return {mdb_file: len(pending) for mdb_file, (_, pending) in self.remaining.items()}
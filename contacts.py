@@ -0,0 +1,129 @@
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+from db_backends import EMPRESAS_QUERY, read_query
+
+CONTACT_COLUMNS = ['MAIL', 'TEL_DOM_LEGAL', 'TEL_DOM_REAL']
+
+# Columna de teléfono de empresas -> columna con el número ya normalizado para WhatsApp
+PHONE_COLUMNS = {'TEL_DOM_LEGAL': 'WHATSAPP_LEGAL', 'TEL_DOM_REAL': 'WHATSAPP_REAL'}
+
+
+def normalize_phones(values):
+    # Formato internacional argentino (+54...) para toda la columna; los números inválidos quedan como NaN
+    values = pd.Series(values, dtype=object)
+    digits = values.astype(str).str.replace(r'\D', '', regex=True)
+    numbers = np.where(digits.str.startswith('0'), '+54' + digits.str[1:],
+                       np.where(digits.str.startswith('54'), '+' + digits, '+54' + digits))
+    numbers = pd.Series(numbers, index=values.index, dtype=object)
+    return numbers.where(values.notna().to_numpy() & (numbers.str.len() >= 12).to_numpy())
+
+
+def normalize_cuit(values):
+    # CUIT como entero, sin guiones ni espacios; los valores inválidos quedan como <NA>
+    digits = pd.Series(values).astype(str).str.replace(r'\D', '', regex=True)
+    digits = digits.where(digits != '')
+    return pd.to_numeric(digits, errors='coerce').astype('Int64')
+
+
+class ContactIndex:
+    def __init__(self, db_path, backend='access', cache_file=None, batch_size=200):
+        self.db_path = db_path
+        self.backend = backend
+        self.cache_file = cache_file
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.fingerprint = None
+        self.index = self._empty()
+        self.missing = set()
+        self._load_cache()
+
+    def _empty(self):
+        return pd.DataFrame(columns=CONTACT_COLUMNS, index=pd.Index([], dtype='int64', name='CUIT'))
+
+    def _db_fingerprint(self):
+        stat = os.stat(self.db_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _load_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            data = pd.read_pickle(self.cache_file)
+            self.fingerprint = data['fingerprint']
+            self.index = data['index']
+            self.missing = set(data['missing'])
+        except Exception as e:
+            print(f"No se pudo leer la caché de contactos: {e}")
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_file))
+        os.makedirs(cache_dir, exist_ok=True)
+        # Temporal propio y reemplazo atómico: otro proceso puede estar leyendo o escribiendo la caché
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            pd.to_pickle({'fingerprint': self.fingerprint, 'index': self.index, 'missing': sorted(self.missing)},
+                         tmp)
+            os.replace(tmp, self.cache_file)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _refresh(self):
+        # Si la base de empresas cambió se descarta el índice y se vuelve a completar a demanda
+        fingerprint = self._db_fingerprint()
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self.index = self._empty()
+            self.missing = set()
+
+    def _query(self, raw_values):
+        frames = []
+        for start in range(0, len(raw_values), self.batch_size):
+            batch = raw_values[start:start + self.batch_size]
+            placeholders = ', '.join('?' * len(batch))
+            query = f'{EMPRESAS_QUERY} WHERE CUIT IN ({placeholders})'
+            frames.append(read_query(self.db_path, query, params=batch, backend=self.backend))
+        if not frames:
+            return self._empty()
+        found = pd.concat(frames, ignore_index=True)
+        found['CUIT'] = normalize_cuit(found['CUIT'])
+        found = found.dropna(subset=['CUIT']).drop_duplicates(subset=['CUIT'], keep='first')
+        return found.set_index(found['CUIT'].astype('int64'))[CONTACT_COLUMNS]
+
+    def resolve(self, raw_cuits):
+        # Devuelve los contactos de los CUIT pedidos, indexados por CUIT normalizado
+        raw_cuits = pd.Series(raw_cuits).dropna()
+        keys = normalize_cuit(raw_cuits)
+        valid = keys.notna().to_numpy()
+        raw_cuits = raw_cuits[valid]
+        keys = keys[valid].astype('int64')
+
+        with self._lock:
+            self._refresh()
+            unknown = ~keys.isin(self.index.index) & ~keys.isin(self.missing)
+            if unknown.any():
+                # Cada CUIT se consulta en todas sus formas (la recibida, el número y el texto con y sin
+                # guiones): así un CUIT no encontrado no existe en ningún formato y se puede recordar
+                pending = raw_cuits[unknown.to_numpy()]
+                params = {value.item() if hasattr(value, 'item') else value for value in pending}
+                for key in keys[unknown.to_numpy()].unique():
+                    key = int(key)
+                    digits = str(key)
+                    params.update([key, digits, f'{digits[:2]}-{digits[2:-1]}-{digits[-1:]}'])
+                found = self._query(sorted(params, key=str))
+                if not found.empty:
+                    self.index = pd.concat([self.index, found])
+                    self.index = self.index[~self.index.index.duplicated(keep='first')]
+                self.missing.update(set(keys[unknown.to_numpy()]) - set(found.index))
+                self._save_cache()
+            return self.index.loc[self.index.index.intersection(keys.unique())]
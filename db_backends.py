@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import pandas as pd
+
+ACTAS_QUERY = 'SELECT NRO_ACTA, RAZON_SOCIAL, FECHA_PAGO_OBL, TOTALDEUDAACTUALIZADA, CUIT FROM actas'
+ACTAS_WINDOW_QUERY = ACTAS_QUERY + ' WHERE FECHA_PAGO_OBL BETWEEN ? AND ? AND TOTALDEUDAACTUALIZADA > 0'
+ACTAS_IDS_QUERY = 'SELECT NRO_ACTA FROM actas'
+EMPRESAS_QUERY = 'SELECT CUIT, EMAIL as MAIL, TEL_DOM_LEGAL, TEL_DOM_REAL FROM vw_EmpresasInterior'
+
+# SQLite guarda las fechas como texto y el separador depende de quién las escribió ('T' o espacio):
+# se comparan a través de datetime(), que siempre devuelve 'AAAA-MM-DD HH:MM:SS'
+SQLITE_QUERIES = {
+    ACTAS_WINDOW_QUERY: ACTAS_QUERY + ' WHERE datetime(FECHA_PAGO_OBL) BETWEEN ? AND ? AND TOTALDEUDAACTUALIZADA > 0',
+}
+
+
+def connect(path, backend='access'):
+    # 'sqlite' permite usar archivos SQLite como sustituto local del driver de Access
+    if backend == 'sqlite':
+        return sqlite3.connect(path)
+    import pyodbc
+    conn_str = f'Driver={{Microsoft Access Driver (*.mdb, *.accdb)}};DBQ={os.path.abspath(path)}'
+    return pyodbc.connect(conn_str)
+
+
+def _query_params(params, backend):
+    if backend == 'sqlite' and params:
+        # Mismo formato que devuelve datetime() en SQLITE_QUERIES
+        params = [p.strftime('%Y-%m-%d %H:%M:%S') if isinstance(p, (date, datetime)) else p for p in params]
+    return params
+
+
+def _query_text(query, backend):
+    return SQLITE_QUERIES.get(query, query) if backend == 'sqlite' else query
+
+
+def read_query(path, query, params=None, backend='access'):
+    query, params = _query_text(query, backend), _query_params(params, backend)
+    conn = connect(path, backend)
+    try:
+        return pd.read_sql(query, conn, params=params)
+    finally:
+        conn.close()
+
+
+def iter_query(path, query, params=None, backend='access', chunksize=50000):
+    # Lee el resultado por bloques de `chunksize` filas; la conexión se cierra al terminar de iterar
+    query, params = _query_text(query, backend), _query_params(params, backend)
+    conn = connect(path, backend)
+    try:
+        yield from pd.read_sql(query, conn, params=params, chunksize=chunksize)
+    finally:
+        conn.close()
+
+
+def stream_reduce(path, reducer, backend='access', query=ACTAS_QUERY, params=None, chunksize=50000):
+    # Aplica `reducer` a cada bloque y conserva solo lo que devuelve: la memoria queda acotada al bloque
+    frames = [reducer(chunk) for chunk in iter_query(path, query, params, backend, chunksize)]
+    if not frames:
+        return None
+    kept = [frame for frame in frames if not frame.empty]
+    return pd.concat(kept, ignore_index=True) if kept else frames[0]
+
+
+def extract_actas(path, backend='access', query=ACTAS_QUERY, params=None):
+    return read_query(path, query, params, backend)
+
+
+def _timed(loader, path):
+    start = time.perf_counter()
+    return loader(path), time.perf_counter() - start
+
+
+def load_parallel(paths, loader, workers=4, executor='thread', timings=None):
+    # Extrae en paralelo; devuelve los resultados en el orden de `paths` y los errores por archivo.
+    # Si se pasa `timings`, se completa con la duración de la extracción de cada archivo.
+    results = {}
+    errors = {}
+    if not paths:
+        return results, errors
+
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    with pool_class(max_workers=max(1, min(workers, len(paths)))) as pool:
+        futures = {path: pool.submit(_timed, loader, path) for path in paths}
+        for path in paths:
+            try:
+                results[path], seconds = futures[path].result()
+                if timings is not None:
+                    timings[path] = seconds
+            except Exception as e:
+                errors[path] = e
+    return results, errors
+
+
+def actas_loader(backend='access', query=ACTAS_QUERY, params=None):
+    # Función serializable para usar con ProcessPoolExecutor
+    return partial(extract_actas, backend=backend, query=query, params=params)
@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from smtp_pool import RateLimiter
+
+
+class _Channel:
+    def __init__(self, name, concurrency, rate, max_pending):
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix=name)
+        self.limiter = RateLimiter(rate)
+        # Contrapresión: submit se bloquea cuando hay demasiados envíos en cola
+        self.slots = threading.BoundedSemaphore(max(1, max_pending))
+        self.futures = []
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stats = {'enviados': 0, 'errores': 0, 'segundos': 0.0}
+
+
+class ChannelDispatcher:
+    def __init__(self):
+        self._channels = {}
+        self._started = time.monotonic()
+
+    def add_channel(self, name, concurrency=1, rate=0, max_pending=100):
+        self._channels[name] = _Channel(name, concurrency, rate, max_pending)
+
+    def submit(self, channel_name, func, *args, **kwargs):
+        channel = self._channels[channel_name]
+        channel.slots.acquire()
+        try:
+            future = channel.executor.submit(self._run, channel, func, args, kwargs)
+        except Exception:
+            channel.slots.release()
+            raise
+        future.add_done_callback(lambda _: channel.slots.release())
+        with channel.lock:
+            channel.futures.append(future)
+        return future
+
+    def _run(self, channel, func, args, kwargs):
+        channel.limiter.wait()
+        start = time.monotonic()
+        try:
+            ok = func(*args, **kwargs) is not False
+        except Exception as e:
+            print(f"Error no controlado en el canal {channel.name}: {e}")
+            ok = False
+        with channel.lock:
+            channel.stats['enviados' if ok else 'errores'] += 1
+            channel.stats['segundos'] += time.monotonic() - start
+        return ok
+
+    def drain(self):
+        # Espera a que terminen todos los envíos y devuelve el resumen de la ejecución
+        for channel in self._channels.values():
+            with channel.lock:
+                futures, channel.futures = channel.futures, []
+            wait(futures)
+
+        summary = {name: dict(channel.stats) for name, channel in self._channels.items()}
+        summary['duracion_total'] = time.monotonic() - self._started
+        for channel in self._channels.values():
+            channel.reset()
+        self._started = time.monotonic()
+        return summary
+
+    def shutdown(self):
+        for channel in self._channels.values():
+            channel.executor.shutdown(wait=True)
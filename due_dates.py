@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+def load_holidays(path='feriados.txt', extra=''):
+    # Feriados en formato AAAA-MM-DD, uno por línea (o separados por coma en FERIADOS)
+    feriados = set()
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#')[0].strip()
+                if line:
+                    feriados.add(line)
+    for item in (extra or '').split(','):
+        if item.strip():
+            feriados.add(item.strip())
+    return sorted(feriados)
+
+
+class DueDateEngine:
+    def __init__(self, dias_aviso=2, dias_mora=20, dias_recupero=7, feriados=()):
+        self.dias_aviso = dias_aviso
+        self.dias_mora = dias_mora
+        self.dias_recupero = dias_recupero
+        self.holidays = np.array(list(feriados), dtype='datetime64[D]')
+
+    def notification_dates(self, vencimientos):
+        # Fecha de aviso previo y de mora, llevadas al día hábil anterior
+        venc = pd.to_datetime(vencimientos, errors='coerce').to_numpy(dtype='datetime64[D]')
+        aviso = np.busday_offset(venc - np.timedelta64(self.dias_aviso, 'D'), 0,
+                                 roll='backward', holidays=self.holidays)
+        mora = np.busday_offset(venc + np.timedelta64(self.dias_mora, 'D'), 0,
+                                roll='backward', holidays=self.holidays)
+        return aviso, mora
+
+    def recovery_start(self, today=None, last_run=None):
+        # Primer día a recuperar: el de la última corrida o, si no hay registro, los días de recupero
+        today = np.datetime64(today or pd.Timestamp.now().date(), 'D')
+        if last_run is not None:
+            return min(np.datetime64(pd.Timestamp(last_run).date(), 'D'), today)
+        return today - np.timedelta64(self.dias_recupero, 'D')
+
+    def candidate_window(self, today=None, margin=7, since=None):
+        # Rango de vencimientos que puede generar un aviso hoy o en los días a recuperar.
+        # El margen cubre fines de semana y feriados que adelantan la fecha de aviso.
+        today = pd.Timestamp(today or pd.Timestamp.now().date()).normalize()
+        since = pd.Timestamp(self.recovery_start(today) if since is None else since)
+        desde = since - pd.Timedelta(days=self.dias_mora)
+        hasta = today + pd.Timedelta(days=self.dias_aviso + margin)
+        return desde, hasta
+
+    def fires_between(self, vencimientos, desde, hasta=None):
+        # Filas con algún aviso (previo o de mora) entre `desde` y `hasta` inclusive; sin `hasta`, desde en adelante
+        aviso, mora = self.notification_dates(vencimientos)
+        desde = np.datetime64(desde, 'D')
+        mask = (aviso >= desde) | (mora >= desde)
+        if hasta is not None:
+            hasta = np.datetime64(hasta, 'D')
+            mask = ((aviso >= desde) & (aviso <= hasta)) | ((mora >= desde) & (mora <= hasta))
+        return mask
+
+    def compute(self, df, today=None, since=None):
+        # Devuelve (avisos de hoy, avisos pendientes desde `since`), una fila por acta y tipo
+        today = np.datetime64(today or pd.Timestamp.now().date(), 'D')
+        aviso, mora = self.notification_dates(df['VENCIMIENTO'])
+        desde = self.recovery_start(today) if since is None else np.datetime64(since, 'D')
+
+        due_today = []
+        pending = []
+        for fechas, is_overdue in ((aviso, False), (mora, True)):
+            hoy_mask = fechas == today
+            pend_mask = (fechas >= desde) & (fechas < today)
+            for mask, out in ((hoy_mask, due_today), (pend_mask, pending)):
+                if mask.any():
+                    sel = df.loc[mask].copy()
+                    sel['ES_MORA'] = is_overdue
+                    sel['FECHA_ENVIO'] = fechas[mask]
+                    out.append(sel)
+
+        columns = list(df.columns) + ['ES_MORA', 'FECHA_ENVIO']
+        return (pd.concat(due_today, ignore_index=True) if due_today else pd.DataFrame(columns=columns),
+                pd.concat(pending, ignore_index=True) if pending else pd.DataFrame(columns=columns))
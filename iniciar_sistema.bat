@@ -1,4 +1,4 @@
 @echo off
 echo Iniciando sistema de notificaciones...
 cd /d "%~dp0"
-powershell -Command "Start-Process pythonw -ArgumentList 'main.py' -Verb RunAs -WindowStyle Hidden -Wait"
\ No newline at end of file
+powershell -Command "Start-Process pythonw -ArgumentList 'main.py','run-once' -Verb RunAs -WindowStyle Hidden -Wait"
\ No newline at end of file
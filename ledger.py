@@ -0,0 +1,254 @@
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+CSV_HEADER = ['Fecha', 'Tipo', 'Acta', 'Destinatario', 'Estado', 'Detalle', 'Aviso']
+# El CSV anterior no indica el tipo de aviso. El previo al vencimiento y el de mora se enviaban con
+# unos 22 días de diferencia: lo registrado más de estos días después del primer envío del acta es mora.
+DIAS_SEPARACION_MORA = 10
+
+
+def connect_read_only(db_file):
+    # Sin -wal no hay otro proceso usando la base: se abre como inmutable para que SQLite
+    # tampoco cree los archivos -wal y -shm
+    mode = 'ro' if os.path.exists(db_file + '-wal') else 'ro&immutable=1'
+    return sqlite3.connect(f'file:{db_file}?mode={mode}', uri=True, check_same_thread=False, timeout=30)
+
+
+class NotificationLedger:
+    def __init__(self, db_file='notificaciones.db', csv_file='notificaciones.csv',
+                 export_csv=True, batch_size=100, read_only=False):
+        self.db_file = db_file
+        self.csv_file = csv_file
+        self.export_csv_enabled = export_csv
+        self.batch_size = batch_size
+        self._lock = threading.RLock()
+        self._pending = []
+        # Índice en memoria: acta -> {tipos de aviso}, y acta -> último día registrado en el CSV anterior
+        self._sent = {}
+        self._legacy = {}
+
+        if read_only:
+            # Solo consulta (vista previa): no se crea ni se modifica la base ni el CSV. Sin base todavía,
+            # el historial se arma en memoria a partir del CSV anterior, si existe.
+            self.export_csv_enabled = False
+            if os.path.exists(db_file):
+                self.conn = connect_read_only(db_file)
+                self.load()
+                return
+            db_file = ':memory:'
+
+        # Mismo tiempo de espera que la cola: con varios procesos la base puede estar bloqueada un momento
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notificaciones (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fecha TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                acta TEXT NOT NULL,
+                destinatario TEXT,
+                estado TEXT,
+                detalle TEXT,
+                aviso TEXT NOT NULL,
+                dia TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_notificaciones_clave
+                ON notificaciones (acta, aviso, dia);
+            CREATE TABLE IF NOT EXISTS meta (
+                clave TEXT PRIMARY KEY,
+                valor TEXT
+            );
+        """)
+        self.conn.commit()
+
+        self.import_csv()
+        self.load()
+        self.initialize_csv()
+
+    def get_meta(self, clave, default=None):
+        with self._lock:
+            row = self.conn.execute('SELECT valor FROM meta WHERE clave = ?', (clave,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, clave, valor):
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)', (clave, str(valor)))
+            self.conn.commit()
+
+    def import_csv(self, csv_file=None):
+        # Importación única del registro CSV histórico
+        csv_file = csv_file or self.csv_file
+        if self.get_meta('csv_importado') or not os.path.exists(csv_file):
+            return 0
+
+        rows = []
+        first_day = {}
+        with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Saltar encabezado
+            for row in reader:
+                if len(row) < 3:
+                    continue
+                row = row + [''] * (7 - len(row))
+                fecha, tipo, acta, destinatario, estado, detalle, aviso = row[:7]
+                dia = fecha.split()[0] if fecha else ''
+                rows.append([fecha, tipo, acta, destinatario, estado, detalle, aviso, dia])
+                if dia and (acta not in first_day or dia < first_day[acta]):
+                    first_day[acta] = dia
+
+        for row in rows:
+            fecha, tipo, acta, _, _, detalle, aviso, dia = row
+            if aviso in ('vencimiento', 'mora'):
+                continue
+            if 'impaga' in tipo or 'impaga' in detalle:
+                row[6] = 'mora'
+            else:
+                row[6] = 'mora' if self._days_between(first_day.get(acta), dia) > DIAS_SEPARACION_MORA else 'vencimiento'
+
+        # La recuperación de avisos empieza en el último envío del CSV, no antes
+        last = max((row[0] for row in rows if row[0]), default=None)
+        with self._lock:
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT INTO notificaciones (fecha, tipo, acta, destinatario, estado, detalle, aviso, dia) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                self.conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('csv_importado', ?)",
+                                  (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),))
+                # Las filas importadas son las de id hasta este valor
+                self.conn.execute("INSERT OR REPLACE INTO meta (clave, valor) "
+                                  "SELECT 'csv_importado_id', COALESCE(MAX(id), 0) FROM notificaciones")
+                if last and self._parse(last) is not None:
+                    self.conn.execute("INSERT OR IGNORE INTO meta (clave, valor) VALUES ('ultima_corrida', ?)",
+                                      (last,))
+        print(f"Se importaron {len(rows)} registros de {csv_file} al registro de notificaciones")
+        if self.export_csv_enabled and os.path.abspath(csv_file) == os.path.abspath(self.csv_file):
+            # El CSV anterior puede no tener la columna Aviso: se reescribe para que todas las filas sean iguales
+            self.export_csv()
+        return len(rows)
+
+    @staticmethod
+    def _parse(value, fmt='%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def _days_between(cls, desde, hasta):
+        desde, hasta = cls._parse(desde, '%Y-%m-%d'), cls._parse(hasta, '%Y-%m-%d')
+        if desde is None or hasta is None:
+            return 0
+        return (hasta - desde).days
+
+    def initialize_csv(self):
+        if self.export_csv_enabled and not os.path.exists(self.csv_file):
+            self.export_csv()
+            # El CSV generado es una copia del registro: no volver a importarlo
+            if not self.get_meta('csv_importado'):
+                self.set_meta('csv_importado', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    def load(self):
+        with self._lock:
+            self._sent = {}
+            for acta, aviso in self.conn.execute('SELECT acta, aviso FROM notificaciones'):
+                self._index(acta, aviso)
+            legacy_id = int(self.get_meta('csv_importado_id', 0) or 0)
+            self._legacy = dict(self.conn.execute(
+                'SELECT acta, MAX(dia) FROM notificaciones WHERE id <= ? GROUP BY acta', (legacy_id,)))
+
+    def _index(self, acta, aviso):
+        self._sent.setdefault(acta, set()).add(aviso)
+
+    def was_notified(self, acta, aviso):
+        return aviso in self._sent.get(str(acta), ())
+
+    def legacy_sent_since(self, acta, dia):
+        # True si el CSV anterior (sin tipo de aviso) registra un envío del acta en `dia` o después
+        last = self._legacy.get(str(acta))
+        return last is not None and last >= dia
+
+    def notified_actas(self, aviso):
+        with self._lock:
+            return [acta for acta, avisos in self._sent.items() if aviso in avisos]
+
+    def history(self):
+        with self._lock:
+            return {acta: set(avisos) for acta, avisos in self._sent.items()}
+
+    def append(self, tipo, acta, destinatario, estado, detalle='', aviso='vencimiento'):
+        now = datetime.now()
+        fecha = now.strftime('%Y-%m-%d %H:%M:%S')
+        dia = now.strftime('%Y-%m-%d')
+        acta = str(acta)
+        with self._lock:
+            self._pending.append((fecha, tipo, acta, str(destinatario), estado, detalle, aviso, dia))
+            self._index(acta, aviso)
+            if len(self._pending) >= self.batch_size:
+                try:
+                    self.flush()
+                except sqlite3.Error as e:
+                    print(f"No se pudo guardar el registro de notificaciones, se reintentará: {e}")
+
+    def flush(self):
+        # Escritura agrupada: una transacción y una apertura del CSV por lote
+        with self._lock:
+            if not self._pending:
+                return
+            # Las filas salen de la lista pendiente recién cuando la transacción se confirmó;
+            # si la base falla (por ejemplo, bloqueada) se reintentan en la próxima escritura
+            rows = list(self._pending)
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT INTO notificaciones (fecha, tipo, acta, destinatario, estado, detalle, aviso, dia) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            del self._pending[:len(rows)]
+            if self.export_csv_enabled:
+                try:
+                    with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
+                        writer = csv.writer(f)
+                        writer.writerows(row[:7] for row in rows)
+                except OSError as e:
+                    print(f"No se pudo actualizar {self.csv_file} (se puede regenerar desde el registro): {e}")
+
+    def export_csv(self, csv_file=None):
+        csv_file = csv_file or self.csv_file
+        with self._lock:
+            self.flush()
+            cursor = self.conn.execute(
+                'SELECT fecha, tipo, acta, destinatario, estado, detalle, aviso FROM notificaciones ORDER BY id')
+            with open(csv_file, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(CSV_HEADER)
+                writer.writerows(cursor)
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self.conn.close()
+
+
+def read_summary(db_file='notificaciones.db'):
+    # Resumen del registro, la cola de envíos y las particiones, en solo lectura (no toca el CSV)
+    conn = connect_read_only(db_file)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        summary = {'notificaciones': [], 'cola': {}, 'particiones': [], 'ultima_corrida': None}
+        if 'notificaciones' in tables:
+            summary['notificaciones'] = conn.execute(
+                'SELECT aviso, tipo, estado, COUNT(*), MAX(fecha) FROM notificaciones '
+                'GROUP BY aviso, tipo, estado ORDER BY aviso, tipo, estado').fetchall()
+        if 'meta' in tables:
+            row = conn.execute("SELECT valor FROM meta WHERE clave = 'ultima_corrida'").fetchone()
+            summary['ultima_corrida'] = row[0] if row else None
+        if 'outbox' in tables:
+            summary['cola'] = dict(conn.execute('SELECT estado, COUNT(*) FROM outbox GROUP BY estado').fetchall())
+        if 'particiones' in tables:
+            summary['particiones'] = conn.execute(
+                'SELECT particion, trabajador, expira FROM particiones ORDER BY particion').fetchall()
+        return summary
+    finally:
+        conn.close()
@@ -0,0 +1,265 @@
+import html
+import string
+
+import numpy as np
+import pandas as pd
+
+# Fuente única del texto de los avisos. Cada bloque se traduce a HTML (email)
+# y a texto plano (WhatsApp) al compilar las plantillas.
+CONTACTO = ('Whatsapp de la Administración: ', '(+543513875875)', ' sólo mensajes, no se atienden llamadas.')
+PIE = [
+    '*** ESTE ES UN MENSAJE AUTOMÁTICO Y NO REQUIERE RESPUESTA ***',
+    '*** SI HA CANCELADO EL ACTA (POSEE RECIBO OFICIAL DE OSECAC) '
+    'O ESTÁ GESTIONANDO EL PAGO CON EL INSPECTOR ASIGNADO, POR FAVOR DESESTIME ESTE MENSAJE ***',
+]
+
+AVISOS = {
+    'vencimiento': {
+        'asunto': 'Aviso vencimiento de deuda - Acta {acta} {razon_social}',
+        'bloques': [
+            ('saludo', 'Estimado/a {razon_social}, {cuit}'),
+            ('detalle', 'Le recordamos que tiene un vencimiento próximo:', [
+                ('Acta', '{acta}'),
+                ('Fecha de Vencimiento', '{vencimiento}'),
+                ('Total a pagar', '${total}'),
+            ]),
+            ('parrafo', 'Por favor, comuníquese con el inspector asignado o con la Administración '
+                        'para regularizar su situación.'),
+            ('contacto', CONTACTO),
+            ('despedida', 'Saludos cordiales.'),
+            ('pie', PIE),
+        ],
+    },
+    'mora': {
+        'asunto': 'Aviso de acta {acta} impaga {razon_social}',
+        'bloques': [
+            ('saludo', 'Estimado/a {razon_social}, {cuit}'),
+            ('parrafo', 'Le recordamos que el acta de inspección Nº {acta}, se encuentra vencida '
+                        'el día {vencimiento} incurriendo en mora.'),
+            ('parrafo', 'Por favor, comuníquese con el inspector asignado o con la Administración '
+                        'para consultar el monto actualizado y regularizar su situación.'),
+            ('contacto', CONTACTO),
+            ('importante', 'IMPORTANTE: Pasados 60 (sesenta) días del vencimiento, se iniciará la gestión '
+                           'de cobro extra judicial por parte del Departamento Legales de esta Delegación.'),
+            ('despedida', 'Saludos cordiales.'),
+            ('pie', PIE),
+        ],
+    },
+}
+
+# Avisos agrupados por CUIT: el bloque 'lista' se repite una vez por acta
+RESUMENES = {
+    'vencimiento': {
+        'asunto': 'Aviso vencimiento de deuda - {cantidad} actas {razon_social}',
+        'bloques': [
+            ('saludo', 'Estimado/a {razon_social}, {cuit}'),
+            ('lista', 'Le recordamos que tiene los siguientes vencimientos próximos:', [
+                ('Acta', '{acta}'),
+                ('Fecha de Vencimiento', '{vencimiento}'),
+                ('Total a pagar', '${total}'),
+            ]),
+            ('parrafo', 'Por favor, comuníquese con el inspector asignado o con la Administración '
+                        'para regularizar su situación.'),
+            ('contacto', CONTACTO),
+            ('despedida', 'Saludos cordiales.'),
+            ('pie', PIE),
+        ],
+    },
+    'mora': {
+        'asunto': 'Aviso de {cantidad} actas impagas {razon_social}',
+        'bloques': [
+            ('saludo', 'Estimado/a {razon_social}, {cuit}'),
+            ('lista', 'Le recordamos que las siguientes actas de inspección se encuentran vencidas, '
+                      'incurriendo en mora:', [
+                ('Acta', '{acta}'),
+                ('Fecha de Vencimiento', '{vencimiento}'),
+                ('Total', '${total}'),
+            ]),
+            ('parrafo', 'Por favor, comuníquese con el inspector asignado o con la Administración '
+                        'para consultar el monto actualizado y regularizar su situación.'),
+            ('contacto', CONTACTO),
+            ('importante', 'IMPORTANTE: Pasados 60 (sesenta) días del vencimiento, se iniciará la gestión '
+                           'de cobro extra judicial por parte del Departamento Legales de esta Delegación.'),
+            ('despedida', 'Saludos cordiales.'),
+            ('pie', PIE),
+        ],
+    },
+}
+
+FIELDS = ('acta', 'cuit', 'razon_social', 'vencimiento', 'total')
+TD_STYLE = 'padding: 4px 12px; border-bottom: 1px solid #eee;'
+
+
+def _html_block(block):
+    kind = block[0]
+    if kind == 'saludo':
+        return f'<div style="color: #333; margin-bottom: 20px;">\n    <p>{block[1]}</p>\n</div>'
+    if kind == 'parrafo':
+        return f'<div style="margin-bottom: 15px;">\n    <p>{block[1]}</p>\n</div>'
+    if kind == 'detalle':
+        lines = '<br>\n    '.join(f'<strong>{label}:</strong> {value}' for label, value in block[2])
+        return f'<div style="margin-bottom: 15px;">\n    <p>{block[1]}</p>\n    <p>{lines}</p>\n</div>'
+    if kind == 'lista':
+        header = ''.join(f'<th style="{TD_STYLE} text-align: left;">{label}</th>' for label, _ in block[2])
+        return (f'<div style="margin-bottom: 15px;">\n    <p>{block[1]}</p>\n'
+                f'    <table style="border-collapse: collapse;">\n    <tr>{header}</tr>\n{{filas}}    </table>\n</div>')
+    if kind == 'contacto':
+        before, strong, after = block[1]
+        return (f'<div style="background-color: #f5f5f5; padding: 10px; margin: 15px 0;">\n'
+                f'    <p>{before}<strong>{strong}</strong>{after}</p>\n</div>')
+    if kind == 'importante':
+        return (f'<div style="background-color: #fff3e0; padding: 15px; margin: 15px 0; '
+                f'border-left: 4px solid #ff9800;">\n    <p><strong>{block[1]}</strong></p>\n</div>')
+    if kind == 'despedida':
+        return f'<p>{block[1]}</p>'
+    if kind == 'pie':
+        lines = '\n    '.join(f'<p style="color: #d32f2f; font-weight: bold;">{line}</p>' for line in block[1])
+        return (f'<div style="color: #666; font-size: 0.9em; border-top: 1px solid #eee; padding-top: 15px;">\n'
+                f'    {lines}\n</div>')
+    raise ValueError(f"Bloque de plantilla desconocido: {kind}")
+
+
+def _text_block(block):
+    kind = block[0]
+    if kind == 'lista':
+        return block[1] + '\n{filas}'
+    if kind == 'detalle':
+        return '\n'.join([block[1]] + [f'{label}: {value}' for label, value in block[2]])
+    if kind == 'contacto':
+        return ''.join(block[1])
+    if kind == 'pie':
+        return '\n'.join(block[1])
+    return block[1]
+
+
+def compile_html(bloques):
+    body = '\n'.join(_html_block(block) for block in bloques)
+    return ('<html>\n<body style="font-family: Arial, sans-serif; line-height: 1.6; margin: 20px;">\n'
+            f'{body}\n</body>\n</html>\n')
+
+
+def compile_text(bloques):
+    return '\n\n'.join(_text_block(block) for block in bloques)
+
+
+def compile_items(bloques):
+    # Plantillas de cada fila de la lista (HTML y texto)
+    columns = next(block[2] for block in bloques if block[0] == 'lista')
+    cells = ''.join(f'<td style="{TD_STYLE}">{value}</td>' for _, value in columns)
+    return f'    <tr>{cells}</tr>\n', '- ' + ' | '.join(f'{label}: {value}' for label, value in columns)
+
+
+class CompiledTemplate:
+    def __init__(self, source):
+        self.source = source
+        # Partes literales y campos, precalculados una sola vez
+        self.parts = [(literal, field) for literal, field, _, _ in string.Formatter().parse(source)]
+
+    def render(self, values):
+        return self.source.format_map(values)
+
+    def render_batch(self, columns, n):
+        result = np.full(n, '', dtype=object)
+        for literal, field in self.parts:
+            if literal:
+                result = result + literal
+            if field is not None:
+                result = result + columns[field]
+        return result
+
+
+class TemplateRenderer:
+    def __init__(self, avisos=AVISOS, resumenes=RESUMENES):
+        self.subjects = {}
+        self.templates = {}
+        for kind, aviso in avisos.items():
+            self.subjects[kind] = CompiledTemplate(aviso['asunto'])
+            self.templates[(kind, 'html')] = CompiledTemplate(compile_html(aviso['bloques']))
+            self.templates[(kind, 'texto')] = CompiledTemplate(compile_text(aviso['bloques']))
+        self.digests = {}
+        for kind, resumen in resumenes.items():
+            html_item, text_item = compile_items(resumen['bloques'])
+            self.digests[kind] = {
+                'asunto': CompiledTemplate(resumen['asunto']),
+                'html': CompiledTemplate(compile_html(resumen['bloques'])),
+                'texto': CompiledTemplate(compile_text(resumen['bloques'])),
+                'item_html': CompiledTemplate(html_item),
+                'item_texto': CompiledTemplate(text_item),
+            }
+
+    @staticmethod
+    def row_values(row):
+        vencimiento = row['VENCIMIENTO']
+        return {
+            'acta': str(row['ACTA']),
+            'cuit': str(row['CUIT']),
+            'razon_social': str(row['RAZON SOCIAL']),
+            'vencimiento': vencimiento.strftime('%d/%m/%Y') if pd.notna(vencimiento) else '',
+            'total': str(row['TOTAL ACTA']),
+        }
+
+    @staticmethod
+    def frame_values(df):
+        # Formateo vectorizado de fechas e importes para todo el lote
+        vencimiento = pd.to_datetime(df['VENCIMIENTO'], errors='coerce')
+        return {
+            'acta': df['ACTA'].astype(str).to_numpy(dtype=object),
+            'cuit': df['CUIT'].astype(str).to_numpy(dtype=object),
+            'razon_social': df['RAZON SOCIAL'].astype(str).to_numpy(dtype=object),
+            'vencimiento': vencimiento.dt.strftime('%d/%m/%Y').fillna('').to_numpy(dtype=object),
+            'total': df['TOTAL ACTA'].astype(str).to_numpy(dtype=object),
+        }
+
+    @staticmethod
+    def escape(values):
+        if isinstance(values['razon_social'], str):
+            return dict(values, razon_social=html.escape(values['razon_social']))
+        escaped = pd.Series(values['razon_social']).map(html.escape).to_numpy(dtype=object)
+        return dict(values, razon_social=escaped)
+
+    def subject(self, values, kind):
+        return self.subjects[kind].render(values)
+
+    def render(self, values, kind, channel):
+        # Una sola fila (los lotes usan render_batch): las plantillas ya están compiladas
+        if channel == 'html':
+            values = self.escape(values)
+        return self.templates[(kind, channel)].render(values)
+
+    def render_batch(self, df, kind):
+        # Devuelve (asuntos, html, texto) para todas las filas del lote
+        n = len(df)
+        values = self.frame_values(df)
+        html_values = self.escape(values)
+        return (self.subjects[kind].render_batch(values, n),
+                self.templates[(kind, 'html')].render_batch(html_values, n),
+                self.templates[(kind, 'texto')].render_batch(values, n))
+
+    def render_digests(self, frame, kind, keys):
+        # Un único mensaje por clave (CUIT) con todas sus actas.
+        # Devuelve [(posiciones, asunto, html, texto)] en el orden de aparición de cada clave.
+        digest = self.digests[kind]
+        n = len(frame)
+        values = self.frame_values(frame)
+        html_values = self.escape(values)
+        html_items = digest['item_html'].render_batch(html_values, n)
+        text_items = digest['item_texto'].render_batch(values, n)
+
+        codes, _ = pd.factorize(pd.Series(keys).reset_index(drop=True), use_na_sentinel=False)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        groups = sorted(np.split(order, bounds), key=lambda positions: positions[0]) if n else []
+
+        result = []
+        for positions in groups:
+            first = positions[0]
+            header = {field: values[field][first] for field in FIELDS}
+            header['cantidad'] = len(positions)
+            html_header = dict(header, razon_social=html_values['razon_social'][first])
+            result.append((
+                positions,
+                digest['asunto'].render(header),
+                digest['html'].render(dict(html_header, filas=''.join(html_items[positions]))),
+                digest['texto'].render(dict(header, filas='\n'.join(text_items[positions]))),
+            ))
+        return result
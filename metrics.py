@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+
+PREFIX = 'aviso_deuda'
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = datetime.now()
+            self.counters = {}
+            self.stages = {}
+            self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_stage(self, name, seconds, rows=None, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            stage = self.stages.setdefault(key, {'segundos': 0.0, 'llamadas': 0, 'filas': 0})
+            stage['segundos'] += seconds
+            stage['llamadas'] += 1
+            if rows is not None:
+                stage['filas'] += rows
+
+    @contextmanager
+    def stage(self, name, rows=None, **labels):
+        # Mide la duración de una etapa; la cantidad de filas puede completarse dentro del bloque
+        info = {'filas': rows}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.add_stage(name, time.perf_counter() - start, info['filas'], **labels)
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.setdefault(key, {'buckets': [0] * (len(BUCKETS) + 1), 'suma': 0.0, 'cantidad': 0})
+            histogram['buckets'][bisect_left(BUCKETS, seconds)] += 1
+            histogram['suma'] += seconds
+            histogram['cantidad'] += 1
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f'# TYPE {PREFIX}_{name}_total counter')
+                for (key, labels), value in sorted(self.counters.items()):
+                    if key == name:
+                        lines.append(f'{PREFIX}_{name}_total{_format_labels(labels)} {value}')
+
+            for metric, field in (('etapa_segundos_total', 'segundos'), ('etapa_llamadas_total', 'llamadas'),
+                                  ('etapa_filas_total', 'filas')):
+                lines.append(f'# TYPE {PREFIX}_{metric} counter')
+                for (name, labels), stage in sorted(self.stages.items()):
+                    lines.append(f'{PREFIX}_{metric}{_format_labels((("etapa", name),) + labels)} {stage[field]}')
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f'# TYPE {PREFIX}_{name} histogram')
+                for (key, labels), histogram in sorted(self.histograms.items()):
+                    if key != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(BUCKETS) + ['+Inf'], histogram['buckets']):
+                        cumulative += count
+                        lines.append(f'{PREFIX}_{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                    lines.append(f'{PREFIX}_{name}_sum{_format_labels(labels)} {histogram["suma"]}')
+                    lines.append(f'{PREFIX}_{name}_count{_format_labels(labels)} {histogram["cantidad"]}')
+        return '\n'.join(lines) + '\n'
+
+    def report(self, **extra):
+        with self._lock:
+            report = {
+                'inicio': self.started.strftime('%Y-%m-%d %H:%M:%S'),
+                'fin': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'duracion_segundos': round((datetime.now() - self.started).total_seconds(), 3),
+                'etapas': [dict(etapa=name, **dict(labels), **stage) for (name, labels), stage in sorted(self.stages.items())],
+                'contadores': [dict(nombre=name, valor=value, **dict(labels))
+                               for (name, labels), value in sorted(self.counters.items())],
+                'latencias': [dict(nombre=name, cantidad=h['cantidad'], segundos_total=h['suma'],
+                                   segundos_promedio=h['suma'] / h['cantidad'] if h['cantidad'] else 0.0,
+                                   **dict(labels))
+                              for (name, labels), h in sorted(self.histograms.items())],
+            }
+        report.update(extra)
+        return report
+
+    def write(self, directory, **extra):
+        # Escritura atómica para que el recolector de Prometheus nunca lea un archivo a medias
+        paths = {'metricas.prom': self.to_prometheus(),
+                 'reporte_corrida.json': json.dumps(self.report(**extra), ensure_ascii=False, indent=2, default=str)}
+        for filename, content in paths.items():
+            path = os.path.join(directory, filename)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(path + '.tmp', path)
+
+
+@contextmanager
+def profiling(mode, directory):
+    # PERFIL=cprofile guarda perfil.prof y un resumen en perfil.txt; PERFIL=tracemalloc guarda memoria.txt
+    if mode == 'cprofile':
+        import cProfile
+        import io
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(directory, 'perfil.prof'))
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(40)
+            with open(os.path.join(directory, 'perfil.txt'), 'w', encoding='utf-8') as f:
+                f.write(output.getvalue())
+    elif mode == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start(25)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(os.path.join(directory, 'memoria.txt'), 'w', encoding='utf-8') as f:
+                f.write(f'Memoria actual: {current / 1024 / 1024:.1f} MB, pico: {peak / 1024 / 1024:.1f} MB\n\n')
+                for stat in snapshot.statistics('lineno')[:40]:
+                    f.write(f'{stat}\n')
+    else:
+        yield
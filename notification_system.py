@@ -0,0 +1,895 @@
+import os
+import pandas as pd
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from ledger import NotificationLedger
+from due_dates import DueDateEngine, load_holidays
+from scheduler import DueScheduler
+from completion import AVISOS, CompletionTracker
+from sharding import LeaseManager, shard_of
+from snapshot_cache import SnapshotCache
+from message_templates import TemplateRenderer
+from db_backends import ACTAS_IDS_QUERY, ACTAS_QUERY, ACTAS_WINDOW_QUERY, actas_loader, load_parallel, stream_reduce
+from contacts import CONTACT_COLUMNS, PHONE_COLUMNS, ContactIndex, normalize_cuit, normalize_phones
+from metrics import Metrics, profiling
+
+class NotificationSystem:
+    def __init__(self, read_only=False):
+        # read_only=True (vista previa): no se crean ni modifican el registro, el CSV, las particiones ni las cachés
+        load_dotenv()
+        self.read_only = read_only
+        self.metrics = Metrics()
+        self.metrics_enabled = os.getenv('METRICAS', '1') == '1'
+        self.profile_mode = os.getenv('PERFIL', '').strip().lower()
+        self.email_sender = os.getenv('EMAIL_SENDER')
+        self.email_password = os.getenv('EMAIL_PASSWORD')
+        # SMTP, WhatsApp, el despachador y la cola se crean (e importan) recién cuando se usan
+        self._components = {}
+        self._components_lock = threading.RLock()
+        self.log_file = 'notificaciones.csv'
+        self.ledger_file = os.getenv('LEDGER_FILE', 'notificaciones.db')
+        self.export_csv = os.getenv('EXPORTAR_CSV', '1') == '1'
+        self.initialize_log_file()
+        self.outbox_max_wait = float(os.getenv('OUTBOX_ESPERA_MAXIMA', '300'))
+        # Con PARTICIONES > 0 varios procesos se reparten los CUIT; cada uno envía solo sus particiones
+        self.shards = int(os.getenv('PARTICIONES', '0'))
+        self.leases = None
+        if self.shards > 0 and not read_only:
+            self.leases = LeaseManager(self.ledger_file, self.shards, os.getenv('TRABAJADOR_ID') or None,
+                                       ttl=float(os.getenv('PARTICIONES_VENCIMIENTO_SEGUNDOS', '60')),
+                                       settle=float(os.getenv('PARTICIONES_ESPERA_INICIAL', '5')))
+        self.db_backend = os.getenv('DB_BACKEND', 'access')
+        self.mdb_workers = int(os.getenv('MDB_WORKERS', '4'))
+        self.mdb_executor = os.getenv('MDB_EXECUTOR', 'thread')
+        self.pushdown = os.getenv('PUSHDOWN_FECHAS', '1') == '1'
+        self.streaming = os.getenv('MODO_STREAMING', '0') == '1'
+        self.chunk_size = int(os.getenv('TAMANO_CHUNK', '50000'))
+        self.snapshot_cache = None
+        if os.getenv('CACHE_MDB', '1') == '1' and not read_only:
+            self.snapshot_cache = SnapshotCache(
+                os.getenv('CACHE_MDB_DIR', '.cache_mdb'),
+                max_bytes=int(float(os.getenv('CACHE_MDB_MAX_MB', '512')) * 1024 * 1024)
+            )
+        self.empresas_db = '4- EMPRESAS CORDOBA.mdb'
+        self.contact_index = ContactIndex(
+            self.empresas_db, backend=self.db_backend,
+            cache_file=os.path.join(os.getenv('CACHE_MDB_DIR', '.cache_mdb'), 'contactos.pkl')
+            if self.snapshot_cache is not None else None
+        )
+        self.digest_mode = os.getenv('MODO_RESUMEN', '0') == '1'
+        self.due_engine = DueDateEngine(
+            dias_aviso=int(os.getenv('DIAS_AVISO_PREVIO', '2')),
+            dias_mora=int(os.getenv('DIAS_MORA', '20')),
+            dias_recupero=int(os.getenv('DIAS_RECUPERO', '7')),
+            feriados=load_holidays(os.getenv('FERIADOS_FILE', 'feriados.txt'), os.getenv('FERIADOS', ''))
+        )
+        self.templates = TemplateRenderer()
+        self.fire_time = os.getenv('HORA_AVISO', '09:00')
+        self.scheduler = DueScheduler(self.due_engine, self.fire_time)
+        self.check_interval = float(os.getenv('REVISION_ARCHIVOS_SEGUNDOS', '300'))
+        self.completion = CompletionTracker()
+        self.cleanup_enabled = os.getenv('LIMPIAR_ARCHIVOS', '0') == '1'
+        self.files_lock = threading.RLock()
+        self._cleanup_thread = None
+        # Las entradas terminadas de la cola se conservan lo necesario para las claves de idempotencia
+        self.outbox_retention = float(os.getenv('OUTBOX_RETENCION_DIAS',
+                                                str(self.due_engine.dias_mora + self.due_engine.dias_recupero)))
+        # Última corrida completa antes de esta: los envíos sin registrar de una caída son posteriores
+        self.previous_run = self.last_run()
+
+    def component(self, name, factory):
+        with self._components_lock:
+            if name not in self._components:
+                self._components[name] = factory()
+            return self._components[name]
+
+    def created(self, name):
+        return self._components.get(name)
+
+    @property
+    def whatsapp(self):
+        return self.component('whatsapp', self.create_whatsapp)
+
+    @property
+    def dispatcher(self):
+        return self.component('dispatcher', self.create_dispatcher)
+
+    @property
+    def smtp_pool(self):
+        return self.component('smtp_pool', self.create_smtp_pool)
+
+    @property
+    def outbox(self):
+        return self.component('outbox', self.create_outbox)
+
+    def create_whatsapp(self):
+        from whatsapp import create_transport
+        return create_transport(
+            os.getenv('WHATSAPP_BACKEND', 'desactivado'),
+            account_sid=os.getenv('TWILIO_ACCOUNT_SID'),
+            auth_token=os.getenv('TWILIO_AUTH_TOKEN'),
+            from_number=os.getenv('TWILIO_WHATSAPP_FROM'),
+            output_file=os.getenv('WHATSAPP_MOCK_ARCHIVO'),
+            latency=os.getenv('WHATSAPP_MOCK_LATENCIA')
+        )
+
+    def create_dispatcher(self):
+        from dispatcher import ChannelDispatcher
+        dispatcher = ChannelDispatcher()
+        dispatcher.add_channel('Email', concurrency=int(os.getenv('EMAIL_CONCURRENCIA', '4')),
+                               rate=float(os.getenv('EMAIL_MENSAJES_POR_SEGUNDO', '0')),
+                               max_pending=int(os.getenv('DESPACHO_MAX_PENDIENTES', '100')))
+        # pywhatkit controla un único navegador: un envío a la vez; las APIs admiten envíos en paralelo
+        dispatcher.add_channel('WhatsApp',
+                               concurrency=int(os.getenv('WHATSAPP_CONCURRENCIA', str(self.whatsapp.concurrency))),
+                               rate=float(os.getenv('WHATSAPP_MENSAJES_POR_SEGUNDO', '0')),
+                               max_pending=int(os.getenv('DESPACHO_MAX_PENDIENTES', '100')))
+        return dispatcher
+
+    def create_smtp_pool(self):
+        from smtp_pool import SMTPPool
+        return SMTPPool(
+            host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+            port=int(os.getenv('SMTP_PORT', '587')),
+            user=self.email_sender,
+            password=self.email_password,
+            starttls=os.getenv('SMTP_STARTTLS', '1') == '1',
+            use_ssl=os.getenv('SMTP_SSL', '0') == '1',
+            size=int(os.getenv('SMTP_POOL_SIZE', os.getenv('EMAIL_CONCURRENCIA', '4'))),
+            max_messages=int(os.getenv('SMTP_MAX_MENSAJES_POR_CONEXION', '100')),
+            rate=float(os.getenv('SMTP_MENSAJES_POR_SEGUNDO', '0'))
+        )
+
+    def create_outbox(self):
+        from outbox import Outbox
+        outbox = Outbox(self.ledger_file,
+                        max_attempts=int(os.getenv('OUTBOX_MAX_INTENTOS', '5')),
+                        backoff=float(os.getenv('OUTBOX_ESPERA_INICIAL', '60')))
+        outbox.purge(self.outbox_retention)
+        if self.leases is None:
+            # Sin particiones, lo que quedó a medio enviar se retoma de inmediato; con particiones, al tomarlas
+            recovered = outbox.recover()
+            if recovered:
+                print(f"Se retoman {recovered} envío(s) interrumpidos en la corrida anterior")
+            self.reconcile_ledger(outbox, since=self.previous_run)
+        return outbox
+
+    def reconcile_ledger(self, outbox, shards=None, since=None):
+        # Registra los envíos que quedaron marcados en la cola sin su fila en el registro. Al tomar
+        # particiones de otro trabajador no se sabe cuándo se cayó: se revisan sus entradas conservadas.
+        estados = {'enviado': 'Enviado', 'omitido': 'Omitido', 'fallido': 'Error'}
+        missing = outbox.unlogged(shards, since)
+        for acta, entry in missing:
+            detalle = '' if entry['estado'] == 'enviado' else entry['ultimo_error'] or ''
+            self.log_notification(entry['canal'], acta, entry['destinatario'], estados[entry['estado']], detalle,
+                                  is_overdue=entry['aviso'] == 'mora')
+        if missing:
+            self.ledger.flush()
+            print(f"Se registraron {len(missing)} envío(s) de la cola que faltaban en el registro")
+
+    def close_smtp(self):
+        if self.created('smtp_pool') is not None:
+            self.smtp_pool.close()
+
+    def load_mdb_data(self, today=None):
+        actas_df = self.load_actas(today)
+        if actas_df is None:
+            return None
+        if self.streaming:
+            return self.compact_actas(actas_df)
+        self.metrics.inc('filas_leidas', len(actas_df))
+        return self.prepare_actas(actas_df)
+
+    def load_actas(self, today=None):
+        try:
+            # Buscar todos los archivos cor*.mdb
+            mdb_files = [f for f in os.listdir() if f.startswith('cor') and f.endswith('.mdb')]
+            if not mdb_files:
+                print("No se encontraron archivos cor*.mdb")
+                return None
+            
+            # Procesar los archivos cor*.mdb en paralelo, en orden determinístico
+            mdb_files.sort()
+            query, params = self.actas_query(today)
+            if self.streaming:
+                actas_by_file, errors = self.stream_actas(mdb_files, self.candidate_reducer(today), query, params)
+            else:
+                actas_by_file, errors = self.read_all_actas(mdb_files, query, params)
+            for mdb_file, e in errors.items():
+                print(f"Error al procesar {mdb_file}: {e}")
+            all_actas = [actas_by_file[f] for f in mdb_files if f in actas_by_file]
+            
+            if not all_actas:
+                print("No se pudo procesar ningún archivo cor*.mdb")
+                return None
+                
+            # Combinar todos los DataFrames
+            return pd.concat(all_actas, ignore_index=True)
+        except Exception as e:
+            print(f"Error al cargar los datos de las bases: {e}")
+            return None
+
+    def prepare_actas(self, actas_df):
+        # Renombrar las columnas para mantener compatibilidad con el código existente
+        df = actas_df.rename(columns={
+            'NRO_ACTA': 'ACTA',
+            'RAZON_SOCIAL': 'RAZON SOCIAL',
+            'FECHA_PAGO_OBL': 'VENCIMIENTO',
+            'TOTALDEUDAACTUALIZADA': 'TOTAL ACTA'
+        })
+        df['VENCIMIENTO'] = pd.to_datetime(df['VENCIMIENTO'], errors='coerce')
+        return df
+
+    @staticmethod
+    def _compact_integer(values):
+        # Solo se pasa a entero si la representación como texto no cambia (ledger y mensajes usan str)
+        numbers = pd.to_numeric(values, errors='coerce')
+        if numbers.isna().any() or (numbers % 1 != 0).any():
+            return values
+        numbers = numbers.astype('int64')
+        return numbers if (numbers.astype(str) == values.astype(str)).all() else values
+
+    def compact_actas(self, df):
+        # Tipos compactos: ACTA y CUIT enteros, RAZON SOCIAL categórica, VENCIMIENTO datetime64
+        df = df.copy()
+        df['ACTA'] = self._compact_integer(df['ACTA'])
+        df['CUIT'] = self._compact_integer(df['CUIT'])
+        df['RAZON SOCIAL'] = df['RAZON SOCIAL'].astype('category')
+        df['VENCIMIENTO'] = pd.to_datetime(df['VENCIMIENTO'], errors='coerce')
+        return df
+
+    def candidate_reducer(self, today=None):
+        # De cada bloque solo se conservan las actas con un aviso hoy o en los días a recuperar
+        today = pd.Timestamp(today or pd.Timestamp.now().date()).normalize()
+        since = self.recovery_start(today)
+
+        def reduce(chunk):
+            self.metrics.inc('filas_leidas', len(chunk))
+            chunk = self.prepare_actas(chunk)
+            return self.compact_actas(chunk.loc[self.due_engine.fires_between(chunk['VENCIMIENTO'], since, today)])
+        return reduce
+
+    def schedule_reducer(self, since):
+        # Para el programador se conservan las actas con deuda y algún aviso desde `since` en adelante
+        def reduce(chunk):
+            self.metrics.inc('filas_leidas', len(chunk))
+            chunk = self.prepare_actas(chunk)
+            mask = self.due_engine.fires_between(chunk['VENCIMIENTO'], since) & (chunk['TOTAL ACTA'] > 0).to_numpy()
+            return self.compact_actas(chunk.loc[mask])
+        return reduce
+
+    def stream_actas(self, mdb_files, reducer, query=ACTAS_QUERY, params=None):
+        # Lectura por bloques de TAMANO_CHUNK filas, sin instantáneas: de cada archivo solo queda lo que
+        # devuelve `reducer`. Siempre con hilos, porque `reducer` no se puede enviar a otro proceso.
+        with self.files_lock:
+            timings = {}
+            loader = partial(stream_reduce, reducer=reducer, backend=self.db_backend, query=query, params=params,
+                             chunksize=self.chunk_size)
+            actas_by_file, errors = load_parallel(mdb_files, loader, workers=self.mdb_workers, executor='thread',
+                                                  timings=timings)
+            for mdb_file, df in actas_by_file.items():
+                if df is None:
+                    actas_by_file[mdb_file] = df = reducer(pd.DataFrame(
+                        columns=['NRO_ACTA', 'RAZON_SOCIAL', 'FECHA_PAGO_OBL', 'TOTALDEUDAACTUALIZADA', 'CUIT']))
+                self.metrics.add_stage('carga_mdb', timings[mdb_file], len(df), archivo=mdb_file, origen='bloques')
+            for mdb_file in errors:
+                self.metrics.inc('errores_carga', archivo=mdb_file)
+            return actas_by_file, errors
+
+    def attach_contacts(self, frame):
+        # Solo se buscan los contactos de los CUIT con avisos pendientes
+        with self.metrics.stage('cruce_contactos', len(frame)):
+            frame = frame.drop(columns=[c for c in CONTACT_COLUMNS if c in frame.columns])
+            if frame.empty or not os.path.exists(self.empresas_db):
+                if not frame.empty:
+                    print(f"No se encontró el archivo {self.empresas_db}")
+                for column in CONTACT_COLUMNS:
+                    frame[column] = None
+                return self.normalize_phone_columns(frame)
+
+            try:
+                contacts = self.contact_index.resolve(frame['CUIT'])
+            except Exception as e:
+                print(f"Error al consultar los contactos de las empresas: {e}")
+                contacts = pd.DataFrame(columns=CONTACT_COLUMNS)
+            keys = normalize_cuit(frame['CUIT']).to_numpy()
+            contacts = contacts.reindex(pd.Index(keys)).reset_index(drop=True)
+            contacts.index = frame.index
+            return self.normalize_phone_columns(frame.join(contacts))
+
+    def normalize_phone_columns(self, frame):
+        # Los números de WhatsApp se formatean una sola vez para todo el lote
+        for column, target in PHONE_COLUMNS.items():
+            frame[target] = normalize_phones(frame[column]).to_numpy()
+        return frame
+
+    def actas_query(self, today=None):
+        # Consulta de actas y parámetros. Con el filtro de fechas solo se traen las actas con deuda
+        # cuyo vencimiento puede generar un aviso hoy.
+        if not self.pushdown:
+            return ACTAS_QUERY, None
+        desde, hasta = self.due_engine.candidate_window(today, since=self.recovery_start(today))
+        hasta = hasta + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        return ACTAS_WINDOW_QUERY, [desde.to_pydatetime(), hasta.to_pydatetime()]
+
+    @staticmethod
+    def apply_window(df, params):
+        # El mismo filtro que ACTAS_WINDOW_QUERY, aplicado sobre una instantánea completa
+        desde, hasta = params
+        fechas = pd.to_datetime(df['FECHA_PAGO_OBL'], errors='coerce')
+        mask = (fechas >= desde) & (fechas <= hasta) & (pd.to_numeric(df['TOTALDEUDAACTUALIZADA'], errors='coerce') > 0)
+        return df.loc[mask.to_numpy()].reset_index(drop=True)
+
+    def read_acta_ids(self, mdb_file):
+        loader = actas_loader(self.db_backend, ACTAS_IDS_QUERY)
+        if self.snapshot_cache is None:
+            return loader(mdb_file)
+        return self.snapshot_cache.get(mdb_file, loader, variant='ids')
+
+    def read_all_actas(self, mdb_files, query=ACTAS_QUERY, params=None):
+        # Los archivos sin cambios se leen desde la instantánea completa en disco; con el filtro de fechas
+        # la ventana se aplica en memoria. Las lecturas filtradas no se guardan: la ventana cambia con cada
+        # corrida y la instantánea no se volvería a usar.
+        with self.files_lock:
+            actas_by_file = {}
+            pending = []
+            for mdb_file in mdb_files:
+                cached = None
+                if self.snapshot_cache is not None:
+                    start = time.perf_counter()
+                    cached = self.snapshot_cache.load(mdb_file)
+                    if cached is not None:
+                        if params:
+                            cached = self.apply_window(cached, params)
+                        self.metrics.add_stage('carga_mdb', time.perf_counter() - start, len(cached),
+                                               archivo=mdb_file, origen='cache')
+                if cached is not None:
+                    actas_by_file[mdb_file] = cached
+                else:
+                    pending.append(mdb_file)
+
+            if pending:
+                print(f"Extrayendo {len(pending)} archivo(s) con {self.mdb_workers} trabajador(es) en paralelo: {', '.join(pending)}")
+            timings = {}
+            extracted, errors = load_parallel(pending, actas_loader(self.db_backend, query, params),
+                                              workers=self.mdb_workers, executor=self.mdb_executor, timings=timings)
+            for mdb_file, df in extracted.items():
+                self.metrics.add_stage('carga_mdb', timings[mdb_file], len(df), archivo=mdb_file, origen='base')
+                if self.snapshot_cache is not None and not params:
+                    self.snapshot_cache.put(mdb_file, df)
+                actas_by_file[mdb_file] = df
+            for mdb_file in errors:
+                self.metrics.inc('errores_carga', archivo=mdb_file)
+            return actas_by_file, errors
+
+    def read_notification_history(self):
+        return self.ledger.history()
+
+    def last_run(self):
+        return self.ledger.get_meta('ultima_corrida')
+
+    def mark_run(self, when=None):
+        self.ledger.set_meta('ultima_corrida', (when or datetime.now()).strftime('%Y-%m-%d %H:%M:%S'))
+
+    def recovery_start(self, today=None):
+        # Se recuperan los avisos desde la última corrida registrada (o los últimos DIAS_RECUPERO días)
+        return self.due_engine.recovery_start(today, self.last_run())
+
+    def filter_notified(self, frame):
+        if frame.empty:
+            return frame
+        # Las filas del CSV anterior no dicen el tipo de aviso: una fila del acta en la fecha del aviso
+        # o después indica que ese aviso ya se envió
+        dias = pd.to_datetime(frame['FECHA_ENVIO']).dt.strftime('%Y-%m-%d')
+        mask = [not self.ledger.was_notified(acta, 'mora' if is_overdue else 'vencimiento')
+                and not self.ledger.legacy_sent_since(acta, dia)
+                for acta, is_overdue, dia in zip(frame['ACTA'].astype(str), frame['ES_MORA'], dias)]
+        selected = frame.loc[mask].drop_duplicates(subset=['ACTA', 'ES_MORA'])
+        self.metrics.inc('avisos_descartados', len(frame) - len(selected), motivo='ya_notificada')
+        return selected
+
+    def owned_shards(self):
+        return None if self.leases is None else self.leases.owned
+
+    def owns_work(self):
+        # Un trabajador sin particiones no envió nada: no debe mover el inicio de la recuperación compartida
+        return self.leases is None or bool(self.leases.owned)
+
+    def own_rows(self, frame):
+        # Con particiones, solo quedan los CUIT que le corresponden a este proceso
+        if self.leases is None or frame.empty:
+            return frame
+        frame = frame.assign(PARTICION=shard_of(frame['CUIT'], self.shards))
+        selected = frame.loc[frame['PARTICION'].isin(self.leases.owned).to_numpy()]
+        self.metrics.inc('avisos_descartados', len(frame) - len(selected), motivo='otra_particion')
+        return selected
+
+    def rebalance_shards(self):
+        # Toma particiones libres o de trabajadores caídos y libera las que sobran
+        self.leases.start()
+        acquired, released = self.leases.rebalance()
+        if released:
+            print(f"Particiones liberadas: {sorted(released)}")
+        if acquired:
+            print(f"Particiones tomadas: {sorted(acquired)} (trabajador {self.leases.worker_id})")
+            recovered = self.outbox.recover(acquired)
+            if recovered:
+                print(f"Se retoman {recovered} envío(s) interrumpidos en esas particiones")
+            # Lo que registraron otros procesos y los avisos de las nuevas particiones se vuelven a cargar
+            self.ledger.flush()
+            self.ledger.load()
+            self.reconcile_ledger(self.outbox, acquired)
+            self.scheduler = DueScheduler(self.due_engine, self.fire_time)
+
+    def select_due_notifications(self, df, today=None):
+        # Cálculo vectorizado de fechas; solo se descartan filas ya notificadas
+        with self.metrics.stage('seleccion_vencimientos', len(df)):
+            due_today, pending = self.due_engine.compute(df, today, since=self.recovery_start(today))
+            due_today, pending = self.own_rows(due_today), self.own_rows(pending)
+            due_today, pending = self.filter_notified(due_today), self.filter_notified(pending)
+        self.metrics.inc('avisos_seleccionados', len(due_today), tipo='hoy')
+        self.metrics.inc('avisos_seleccionados', len(pending), tipo='pendiente')
+        return due_today, pending
+
+    def preview_due_notifications(self, today=None):
+        # Avisos que se enviarían en una corrida, con sus contactos; no envía ni registra nada.
+        # Con particiones se muestran todos los CUIT, sin tomar particiones.
+        df = self.load_mdb_data(today)
+        if df is None:
+            return None
+        due_today, pending = self.due_engine.compute(df, today, since=self.recovery_start(today))
+        due = pd.concat([self.filter_notified(pending), self.filter_notified(due_today)], ignore_index=True)
+        return self.attach_contacts(due)
+
+    def check_upcoming_due_dates(self, df):
+        due_today, _ = self.select_due_notifications(df)
+        due_today = self.render_due_batch(self.attach_contacts(due_today))
+
+        # Only send if we haven't sent this type before and dates match exactly
+        if self.digest_mode:
+            self.send_digest_notifications(due_today)
+            return
+        for row in due_today.to_dict('records'):
+            if row['ES_MORA']:
+                print(f"Enviando primera y única notificación de mora para acta {row['ACTA']}")
+            else:
+                print(f"Enviando primera y única notificación de vencimiento para acta {row['ACTA']}")
+            self.send_notifications(row, is_overdue=row['ES_MORA'])
+
+    def initialize_log_file(self):
+        # El registro indexado importa una sola vez el CSV existente y lo mantiene actualizado
+        self.ledger = NotificationLedger(self.ledger_file, self.log_file, export_csv=self.export_csv,
+                                         read_only=self.read_only)
+
+    def log_notification(self, notification_type, acta, destinatario, estado, detalle='', is_overdue=False):
+        aviso = 'mora' if is_overdue else 'vencimiento'
+        self.ledger.append(notification_type, acta, destinatario, estado, detalle, aviso=aviso)
+        self.completion.mark(acta, aviso)
+
+    def render_email(self, row, is_overdue=False):
+        if 'CUERPO_HTML' in row:
+            return row['ASUNTO'], row['CUERPO_HTML']
+        kind = 'mora' if is_overdue else 'vencimiento'
+        values = self.templates.row_values(row)
+        return self.templates.subject(values, kind), self.templates.render(values, kind, 'html')
+
+    def send_email(self, entry):
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+        msg = MIMEMultipart()
+        msg['From'] = self.email_sender
+        msg['To'] = entry['destinatario']
+        msg['Subject'] = entry['payload']['asunto']
+        msg.attach(MIMEText(entry['payload']['cuerpo'], 'html'))
+        self.smtp_pool.send_message(msg)
+        print(f"Email enviado a {entry['destinatario']}")
+
+    def render_whatsapp(self, row, is_overdue=False):
+        if 'CUERPO_TEXTO' in row:
+            return row['CUERPO_TEXTO']
+        kind = 'mora' if is_overdue else 'vencimiento'
+        return self.templates.render(self.templates.row_values(row), kind, 'texto')
+
+    def render_due_batch(self, frame):
+        # Arma asunto y cuerpos de todo el lote de una vez, agrupando por tipo de aviso
+        if frame.empty:
+            return frame
+        with self.metrics.stage('armado_mensajes', len(frame)):
+            frame = frame.copy()
+            for is_overdue in (False, True):
+                mask = (frame['ES_MORA'] == is_overdue).to_numpy()
+                if mask.any():
+                    subjects, html_bodies, text_bodies = self.templates.render_batch(
+                        frame.loc[mask], 'mora' if is_overdue else 'vencimiento')
+                    frame.loc[mask, 'ASUNTO'] = subjects
+                    frame.loc[mask, 'CUERPO_HTML'] = html_bodies
+                    frame.loc[mask, 'CUERPO_TEXTO'] = text_bodies
+        return frame
+
+    def send_whatsapp(self, entry):
+        print(f"Intentando enviar WhatsApp a {entry['destinatario']}")
+        self.whatsapp.send(entry['destinatario'], entry['payload']['cuerpo'])
+        print(f"WhatsApp enviado exitosamente a {entry['destinatario']}")
+
+    def send_notifications(self, row, is_overdue=False):
+        # Verificar si el total de la deuda es mayor a cero
+        if row['TOTAL ACTA'] <= 0:
+            print(f"No se envían notificaciones para el acta {row['ACTA']} porque el total es {row['TOTAL ACTA']}")
+            self.metrics.inc('avisos_descartados', motivo='sin_deuda')
+            return
+
+        # Cada envío queda en la cola persistente con su clave (acta, aviso, canal, destinatario);
+        # una clave ya encolada en otra corrida no se vuelve a agregar
+        aviso = 'mora' if is_overdue else 'vencimiento'
+        actas = row.get('ACTAS', [row['ACTA']])
+        if pd.notna(row['MAIL']):
+            subject, html = self.render_email(row, is_overdue)
+            self.outbox.enqueue(actas, aviso, 'Email', row['MAIL'], {'asunto': subject, 'cuerpo': html},
+                                shard=row.get('PARTICION', 0))
+            self.metrics.inc('encolados', canal='Email')
+        message = None
+        invalid = []
+        if not all(target in row for target in PHONE_COLUMNS.values()):
+            row = dict(row)
+            for column, target in PHONE_COLUMNS.items():
+                row[target] = normalize_phones([row[column]])[0]
+        for column, target in PHONE_COLUMNS.items():
+            phone, phone_number = row[column], row[target]
+            if pd.isna(phone):
+                continue
+            if pd.isna(phone_number):
+                invalid.append(phone)
+                continue
+            if message is None:
+                message = self.render_whatsapp(row, is_overdue)
+            self.outbox.enqueue(actas, aviso, 'WhatsApp', phone_number, {'cuerpo': message},
+                                shard=row.get('PARTICION', 0))
+            self.metrics.inc('encolados', canal='WhatsApp')
+
+        if invalid:
+            # El error marca el acta como notificada: antes de registrarlo, los envíos del acta ya
+            # tienen que estar guardados en la cola
+            self.outbox.flush()
+        for phone in invalid:
+            error_msg = f"Número de teléfono inválido: {phone}"
+            print(error_msg)
+            for acta in actas:
+                self.log_notification('WhatsApp', acta, str(phone), 'Error', error_msg, is_overdue=is_overdue)
+            self.metrics.inc('notificaciones', canal='WhatsApp', estado='telefono_invalido')
+
+    def deliver(self, entry):
+        is_overdue = entry['aviso'] == 'mora'
+        start = time.perf_counter()
+        try:
+            if entry['canal'] == 'Email':
+                self.send_email(entry)
+            else:
+                self.send_whatsapp(entry)
+        except Exception as e:
+            self.metrics.observe('envio_segundos', time.perf_counter() - start, canal=entry['canal'],
+                                 resultado=type(e).__name__)
+            error_msg = f"Error al enviar {entry['canal']} a {entry['destinatario']}: {e}"
+            print(error_msg)
+            if self.outbox.mark_failed(entry, error_msg):
+                # Sin más reintentos: queda como 'fallido' en la cola y como error en el registro
+                for acta in entry['actas']:
+                    self.log_notification(entry['canal'], acta, entry['destinatario'], 'Error', error_msg,
+                                          is_overdue=is_overdue)
+                self.metrics.inc('notificaciones', canal=entry['canal'], estado='error')
+            else:
+                self.metrics.inc('notificaciones', canal=entry['canal'], estado='reintento')
+            return False
+        self.metrics.observe('envio_segundos', time.perf_counter() - start, canal=entry['canal'], resultado='ok')
+        self.metrics.inc('notificaciones', canal=entry['canal'], estado='enviado')
+        self.outbox.mark_sent(entry['clave'])
+        for acta in entry['actas']:
+            self.log_notification(entry['canal'], acta, entry['destinatario'], 'Enviado', is_overdue=is_overdue)
+        return True
+
+    def skip_entries(self, entries, detalle):
+        for entry in entries:
+            self.outbox.mark_skipped(entry['clave'], detalle)
+            for acta in entry['actas']:
+                self.log_notification(entry['canal'], acta, entry['destinatario'], 'Omitido', detalle,
+                                      is_overdue=entry['aviso'] == 'mora')
+            self.metrics.inc('notificaciones', canal=entry['canal'], estado='omitido')
+
+    def drain_outbox(self):
+        # Envía lo que está listo en la cola; los reintentos cercanos se esperan dentro de la corrida
+        # y el resto queda pendiente para la próxima
+        summary = None
+        deadline = time.time() + self.outbox_max_wait
+        while True:
+            entries = self.outbox.claim_ready(shards=self.owned_shards(),
+                                              worker=None if self.leases is None else self.leases.worker_id)
+            whatsapp = [e for e in entries if e['canal'] == 'WhatsApp']
+            if whatsapp and not self.whatsapp.available():
+                print(f"{self.whatsapp.unavailable_reason}. Se omitirá el envío de mensajes por WhatsApp.")
+                self.skip_entries(whatsapp, self.whatsapp.unavailable_reason)
+                entries = [e for e in entries if e['canal'] != 'WhatsApp']
+            for entry in entries:
+                self.dispatcher.submit(entry['canal'], self.deliver, entry)
+            drained = self.dispatcher.drain()
+            for channel in ('Email', 'WhatsApp'):
+                stats = drained[channel]
+                if stats['enviados'] or stats['errores']:
+                    self.metrics.add_stage('envio', stats['segundos'], stats['enviados'] + stats['errores'], canal=channel)
+            summary = self.merge_summaries(summary, drained)
+
+            next_retry = self.outbox.next_retry_time(self.owned_shards())
+            if next_retry is None or next_retry > deadline:
+                break
+            time.sleep(max(0, next_retry - time.time()))
+        return summary
+
+    def merge_summaries(self, total, summary):
+        if total is None:
+            return summary
+        for channel, stats in summary.items():
+            if channel == 'duracion_total':
+                total[channel] += stats
+            else:
+                for key, value in stats.items():
+                    total[channel][key] += value
+        return total
+
+    def send_digest_notifications(self, frame):
+        # Un mensaje por CUIT y tipo de aviso con todas sus actas; el registro sigue siendo por acta
+        if frame.empty:
+            return
+        sin_deuda = frame['TOTAL ACTA'] <= 0
+        for acta in frame.loc[sin_deuda, 'ACTA']:
+            print(f"No se envían notificaciones para el acta {acta} porque el total es 0 o negativo")
+        frame = frame.loc[~sin_deuda]
+
+        for is_overdue in (False, True):
+            group = frame.loc[(frame['ES_MORA'] == is_overdue).to_numpy()]
+            if group.empty:
+                continue
+            kind = 'mora' if is_overdue else 'vencimiento'
+            # La clave de un resumen es el conjunto de sus actas: un acta que ya está en un resumen de la
+            # cola (por ejemplo, esperando un reintento) no se agrega a otro, que se enviaría además del primero
+            queued = group['ACTA'].astype(str).isin(self.outbox.open_actas(kind)).to_numpy()
+            if queued.any():
+                self.metrics.inc('avisos_descartados', int(queued.sum()), motivo='en_cola')
+                group = group.loc[~queued]
+                if group.empty:
+                    continue
+            records = group.to_dict('records')
+            for positions, subject, html_body, text_body in self.templates.render_digests(group, kind, group['CUIT']):
+                row = records[positions[0]]
+                if len(positions) > 1:
+                    row = dict(row, ASUNTO=subject, CUERPO_HTML=html_body, CUERPO_TEXTO=text_body,
+                               ACTAS=[records[i]['ACTA'] for i in positions])
+                    print(f"Enviando resumen de {len(positions)} actas ({kind}) a {row['RAZON SOCIAL']}")
+                self.send_notifications(row, is_overdue=is_overdue)
+
+    def refresh_completion(self, mdb_files):
+        # Solo se cuentan de nuevo los archivos nuevos o modificados; el resto se actualiza al registrar
+        for mdb_file in list(self.completion.remaining):
+            if mdb_file not in mdb_files:
+                self.completion.forget(mdb_file)
+        changed = {}
+        for mdb_file in mdb_files:
+            stat = os.stat(mdb_file)
+            fingerprint = (stat.st_size, stat.st_mtime_ns)
+            if fingerprint != self.completion.fingerprint(mdb_file):
+                changed[mdb_file] = fingerprint
+        if not changed:
+            return
+
+        notified = {aviso: self.ledger.notified_actas(aviso) for aviso in AVISOS}
+        for mdb_file, fingerprint in changed.items():
+            try:
+                df = self.read_acta_ids(mdb_file)
+                self.completion.track(mdb_file, fingerprint, df['NRO_ACTA'], notified)
+            except Exception as e:
+                print(f"Error al procesar {mdb_file}: {e}")
+        # Avisos registrados mientras se armaban los contadores
+        for mdb_file in changed:
+            for acta, aviso in list(self.completion.remaining.get(mdb_file, (None, ()))[1]):
+                if self.ledger.was_notified(acta, aviso):
+                    self.completion.mark(acta, aviso)
+
+    def clean_completed_csv_files(self):
+        with self.files_lock:
+            mdb_files = [f for f in os.listdir() if f.startswith('cor') and f.endswith('.mdb')]
+            self.refresh_completion(mdb_files)
+
+            # Archivos con todas sus actas notificadas (vencimiento y mora)
+            for mdb_file in self.completion.completed():
+                # Eliminar archivo CSV si existe
+                csv_file = mdb_file.replace('.mdb', '.csv')
+                if os.path.exists(csv_file):
+                    os.remove(csv_file)
+                    print(f"Se eliminó el archivo {csv_file} ya que todas sus actas fueron notificadas.")
+
+                # Eliminar solo el archivo MDB
+                try:
+                    if self.snapshot_cache is not None:
+                        self.snapshot_cache.invalidate(mdb_file)
+                    os.remove(mdb_file)
+                    self.completion.forget(mdb_file)
+                    print(f"Se eliminó el archivo {mdb_file} ya que todas sus actas fueron notificadas.")
+                except Exception as e:
+                    print(f"Error al eliminar el archivo {mdb_file}: {e}")
+
+    def clean_completed_csv_files_async(self):
+        # La limpieza corre en segundo plano para no demorar el despacho
+        if self._cleanup_thread is not None and self._cleanup_thread.is_alive():
+            return self._cleanup_thread
+        self._cleanup_thread = threading.Thread(target=self.clean_completed_csv_files, name='limpieza', daemon=True)
+        self._cleanup_thread.start()
+        return self._cleanup_thread
+
+    def check_pending_notifications(self, df):
+        _, pending = self.select_due_notifications(df)
+        pending = self.render_due_batch(self.attach_contacts(pending))
+
+        # Revisar notificaciones pendientes de los últimos días
+        if self.digest_mode:
+            self.send_digest_notifications(pending)
+            return
+        for row in pending.to_dict('records'):
+            if self.ledger.was_notified(row['ACTA'], 'mora' if row['ES_MORA'] else 'vencimiento'):
+                continue
+            print(f"Enviando notificación pendiente para acta {row['ACTA']} del {row['FECHA_ENVIO']:%Y-%m-%d}")
+            self.send_notifications(row, row['ES_MORA'])
+
+    @contextmanager
+    def instrumented_run(self, name, reset=True):
+        # Métricas de la corrida (y perfil si PERFIL está definido) junto a notificaciones.csv.
+        # Con reset=False se conservan las etapas ya medidas (la lectura de archivos del modo permanente).
+        if reset:
+            self.metrics.reset()
+        directory = os.path.dirname(os.path.abspath(self.log_file))
+        try:
+            with profiling(self.profile_mode, directory):
+                with self.metrics.stage(name):
+                    yield
+        finally:
+            if self.metrics_enabled:
+                try:
+                    extra = {'cola': self.outbox.stats()}
+                    if self.cleanup_enabled:
+                        # Avisos que le faltan a cada cor*.mdb antes de poder borrarlo
+                        extra['avisos_faltantes'] = self.completion.remaining_counts()
+                    self.metrics.write(directory, corrida=name, **extra)
+                except Exception as e:
+                    print(f"No se pudieron guardar las métricas: {e}")
+
+    def check_mdb_files(self):
+        if self.leases is not None:
+            self.rebalance_shards()
+        with self.instrumented_run('check_mdb_files'):
+            started = datetime.now()
+            df = self.load_mdb_data()
+            try:
+                if df is not None:
+                    self.check_pending_notifications(df)  # Verificar notificaciones pendientes
+                    self.check_upcoming_due_dates(df)  # Verificar notificaciones del día actual
+                    if self.owns_work():
+                        # Los avisos encolados se guardan antes de mover la última corrida: si el proceso
+                        # se cae antes de enviarlos, la próxima corrida los retoma de la cola
+                        self.outbox.flush()
+                        self.mark_run(started)
+            finally:
+                # También se retoman los envíos que quedaron en la cola de corridas anteriores
+                summary = self.drain_outbox()
+                self.close_smtp()
+                self.ledger.flush()
+            self.print_dispatch_summary(summary)
+        if self.cleanup_enabled:
+            self.clean_completed_csv_files_async()
+
+    def refresh_schedule(self):
+        # Solo se vuelven a leer los cor*.mdb nuevos o modificados; los borrados salen del programa
+        since = self.recovery_start()
+        mdb_files = sorted(f for f in os.listdir() if f.startswith('cor') and f.endswith('.mdb'))
+        for mdb_file in list(self.scheduler.files):
+            if mdb_file not in mdb_files:
+                self.scheduler.remove_file(mdb_file)
+        changed = {}
+        for mdb_file in mdb_files:
+            stat = os.stat(mdb_file)
+            fingerprint = (stat.st_size, stat.st_mtime_ns)
+            if fingerprint != self.scheduler.fingerprint(mdb_file):
+                changed[mdb_file] = fingerprint
+        if not changed:
+            return True
+
+        if self.streaming:
+            actas_by_file, errors = self.stream_actas(list(changed), self.schedule_reducer(since))
+        else:
+            actas_by_file, errors = self.read_all_actas(list(changed))
+        for mdb_file, e in errors.items():
+            print(f"Error al procesar {mdb_file}: {e}")
+        for mdb_file, df in actas_by_file.items():
+            if not self.streaming:
+                self.metrics.inc('filas_leidas', len(df))
+            scheduled = self.scheduler.update_file(mdb_file, changed[mdb_file], self.prepare_actas(df), since)
+            print(f"{mdb_file}: {scheduled} aviso(s) programado(s)")
+        return not errors
+
+    def run_due(self, now):
+        with self.instrumented_run('run_due', reset=False):
+            due = self.scheduler.pop_due(now)
+            try:
+                if due is not None:
+                    self.metrics.inc('avisos_seleccionados', len(due), tipo='programado')
+                    due = self.render_due_batch(self.attach_contacts(self.filter_notified(self.own_rows(due))))
+                    if self.digest_mode:
+                        self.send_digest_notifications(due)
+                    else:
+                        for row in due.to_dict('records'):
+                            kind = 'mora' if row['ES_MORA'] else 'vencimiento'
+                            print(f"Enviando notificación de {kind} para acta {row['ACTA']} del {row['FECHA_ENVIO']:%Y-%m-%d}")
+                            self.send_notifications(row, row['ES_MORA'])
+            finally:
+                summary = self.drain_outbox()
+                self.close_smtp()
+                self.ledger.flush()
+            self.print_dispatch_summary(summary)
+        if self.cleanup_enabled:
+            self.clean_completed_csv_files_async()
+
+    def run_scheduler(self):
+        # Duerme hasta el próximo aviso programado (o la próxima revisión de archivos / reintento)
+        while True:
+            try:
+                if self.leases is not None:
+                    self.rebalance_shards()
+                # Las métricas de cada vuelta incluyen la lectura de archivos y, si corresponde, el envío
+                self.metrics.reset()
+                now = datetime.now()
+                with self.metrics.stage('refresh_schedule'):
+                    complete = self.refresh_schedule()
+                next_fire = self.scheduler.next_fire()
+                next_retry = self.outbox.next_retry_time(self.owned_shards())
+                if (next_fire is not None and next_fire <= now) or (next_retry is not None and next_retry <= time.time()):
+                    self.run_due(now)
+                if complete and self.owns_work():
+                    self.outbox.flush()
+                    self.mark_run(now)
+            except Exception as e:
+                print(f"Error en la ejecución programada: {e}")
+
+            interval = self.check_interval
+            if self.leases is not None:
+                # Las particiones se reparten de nuevo en cada vuelta: a lo sumo medio vencimiento de espera
+                interval = min(interval, self.leases.ttl / 2)
+            wake = datetime.now() + timedelta(seconds=interval)
+            next_fire = self.scheduler.next_fire()
+            if next_fire is not None:
+                wake = min(wake, next_fire)
+            next_retry = self.outbox.next_retry_time(self.owned_shards())
+            if next_retry is not None:
+                wake = min(wake, datetime.fromtimestamp(next_retry))
+            time.sleep(max(1.0, (wake - datetime.now()).total_seconds()))
+
+    def close(self):
+        # La limpieza en segundo plano usa el registro: se espera a que termine antes de cerrarlo
+        if self._cleanup_thread is not None:
+            self._cleanup_thread.join()
+        if self.leases is not None:
+            # El registro se guarda antes de liberar las particiones, para que quien las tome lo vea completo
+            self.ledger.flush()
+            self.leases.stop()
+        if self.created('dispatcher') is not None:
+            self.dispatcher.shutdown()
+        self.close_smtp()
+        if self.created('outbox') is not None:
+            self.outbox.close()
+        self.ledger.close()
+
+    def print_dispatch_summary(self, summary):
+        print(f"Resumen de envíos ({summary['duracion_total']:.1f} s):")
+        for channel in ('Email', 'WhatsApp'):
+            stats = summary[channel]
+            print(f"  {channel}: {stats['enviados']} enviados, {stats['errores']} con error")
+        estados = self.outbox.stats()
+        print(f"  Cola: {estados.get('pendiente', 0)} pendientes de reintento, {estados.get('fallido', 0)} fallidos")
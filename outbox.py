@@ -0,0 +1,212 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+TERMINAL_STATES = ('enviado', 'omitido', 'fallido')
+
+
+class Outbox:
+    def __init__(self, db_file='notificaciones.db', max_attempts=5, backoff=60.0):
+        self.db_file = db_file
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._lock = threading.RLock()
+        self._pending = []
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                clave TEXT PRIMARY KEY,
+                actas TEXT NOT NULL,
+                aviso TEXT NOT NULL,
+                canal TEXT NOT NULL,
+                destinatario TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                intentos INTEGER NOT NULL DEFAULT 0,
+                proximo_intento REAL NOT NULL DEFAULT 0,
+                ultimo_error TEXT,
+                creado TEXT NOT NULL,
+                actualizado TEXT NOT NULL,
+                particion INTEGER NOT NULL DEFAULT 0,
+                trabajador TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_estado ON outbox (estado, proximo_intento);
+            CREATE INDEX IF NOT EXISTS idx_outbox_actualizado ON outbox (actualizado);
+        """)
+        # Colas creadas antes de la ejecución en paralelo por particiones
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(outbox)')}
+        if 'particion' not in columns:
+            self.conn.execute('ALTER TABLE outbox ADD COLUMN particion INTEGER NOT NULL DEFAULT 0')
+        if 'trabajador' not in columns:
+            self.conn.execute('ALTER TABLE outbox ADD COLUMN trabajador TEXT')
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(actas, aviso, canal, destinatario):
+        # Clave de idempotencia: (acta, tipo de aviso, canal, destinatario)
+        return '|'.join(['+'.join(sorted(str(a) for a in actas)), aviso, canal, str(destinatario)])
+
+    def _now(self):
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def _shard_filter(shards):
+        if shards is None:
+            return '', []
+        shards = sorted(shards)
+        return f" AND particion IN ({', '.join('?' * len(shards))})", shards
+
+    def recover(self, shards=None):
+        # Los envíos que quedaron a medio camino por una caída vuelven a la cola
+        condition, params = self._shard_filter(shards)
+        with self._lock:
+            with self.conn:
+                cursor = self.conn.execute(
+                    "UPDATE outbox SET estado = 'pendiente', actualizado = ? WHERE estado = 'enviando'" + condition,
+                    [self._now()] + params)
+            return cursor.rowcount
+
+    def enqueue(self, actas, aviso, canal, destinatario, payload, shard=0):
+        actas = [str(a) for a in actas]
+        now = self._now()
+        key = self.make_key(actas, aviso, canal, destinatario)
+        with self._lock:
+            self._pending.append((key, json.dumps(actas), aviso, canal, str(destinatario),
+                                  json.dumps(payload, ensure_ascii=False), now, now, int(shard)))
+        return key
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return 0
+            # Como en el registro, las filas se descartan recién cuando la transacción se confirmó
+            rows = list(self._pending)
+            with self.conn:
+                before = self.conn.total_changes
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO outbox (clave, actas, aviso, canal, destinatario, payload, creado, actualizado, '
+                    'particion) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                added = self.conn.total_changes - before
+            del self._pending[:len(rows)]
+            return added
+
+    def claim_ready(self, limit=None, shards=None, worker=None):
+        # Marca como 'enviando' las entradas listas para enviar y las devuelve. La lectura y la marca van
+        # en una misma transacción con bloqueo de escritura: dos procesos nunca toman la misma entrada.
+        self.flush()
+        condition, shard_params = self._shard_filter(shards)
+        with self._lock:
+            query = ("SELECT clave, actas, aviso, canal, destinatario, payload, intentos FROM outbox "
+                     "WHERE estado = 'pendiente' AND proximo_intento <= ?" + condition + " ORDER BY creado, clave")
+            params = [time.time()] + shard_params
+            if limit:
+                query += ' LIMIT ?'
+                params.append(limit)
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.conn.execute(query, params).fetchall()
+                self.conn.executemany(
+                    "UPDATE outbox SET estado = 'enviando', trabajador = ?, actualizado = ? "
+                    "WHERE clave = ? AND estado = 'pendiente'",
+                    [(worker, self._now(), row[0]) for row in rows])
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        return [{
+            'clave': clave,
+            'actas': json.loads(actas),
+            'aviso': aviso,
+            'canal': canal,
+            'destinatario': destinatario,
+            'payload': json.loads(payload),
+            'intentos': intentos,
+        } for clave, actas, aviso, canal, destinatario, payload, intentos in rows]
+
+    def _set_state(self, clave, estado, error=None, intentos_delta=0, proximo_intento=0.0):
+        # Una entrada terminada no se vuelve a enviar: el mensaje ya no hace falta y se descarta
+        with self._lock:
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE outbox SET estado = ?, ultimo_error = ?, intentos = intentos + ?, "
+                    "proximo_intento = ?, actualizado = ?, "
+                    "payload = CASE WHEN ? THEN 'null' ELSE payload END WHERE clave = ?",
+                    (estado, error, intentos_delta, proximo_intento, self._now(), estado in TERMINAL_STATES, clave))
+
+    def mark_sent(self, clave):
+        self._set_state(clave, 'enviado', intentos_delta=1)
+
+    def mark_skipped(self, clave, detalle):
+        self._set_state(clave, 'omitido', detalle)
+
+    def mark_failed(self, entry, error):
+        # Reintento con espera exponencial; al agotar los intentos pasa a 'fallido'
+        intentos = entry['intentos'] + 1
+        if intentos >= self.max_attempts:
+            self._set_state(entry['clave'], 'fallido', error, intentos_delta=1)
+            return True
+        delay = self.backoff * 2 ** (intentos - 1)
+        self._set_state(entry['clave'], 'pendiente', error, intentos_delta=1, proximo_intento=time.time() + delay)
+        return False
+
+    def open_actas(self, aviso):
+        # Actas con un envío de `aviso` todavía en la cola (pendiente o enviando)
+        self.flush()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT a.value FROM outbox o, json_each(o.actas) a "
+                "WHERE o.estado IN ('pendiente', 'enviando') AND o.aviso = ?", (aviso,)).fetchall()
+        return {str(row[0]) for row in rows}
+
+    def purge(self, days):
+        # Borra las entradas terminadas hace más de `days` días; el registro ya evita volver a encolarlas
+        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            with self.conn:
+                cursor = self.conn.execute(
+                    f"DELETE FROM outbox WHERE estado IN ({', '.join('?' * len(TERMINAL_STATES))}) "
+                    "AND actualizado < ?", TERMINAL_STATES + (cutoff,))
+            return cursor.rowcount
+
+    def unlogged(self, shards=None, since=None):
+        # Envíos terminados cuyas actas no tienen fila en el registro: el proceso se cayó después de
+        # marcar la entrada y antes de guardar el lote del registro. Con `since` solo se revisan las
+        # entradas actualizadas desde ese momento (la última corrida). Devuelve (acta, entrada) por acta.
+        condition, params = self._shard_filter(shards)
+        if since:
+            condition += ' AND actualizado >= ?'
+            params = params + [since]
+        with self._lock:
+            tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if 'notificaciones' not in tables:
+                return []
+            rows = self.conn.execute(
+                "SELECT a.value, o.aviso, o.canal, o.destinatario, o.estado, o.ultimo_error "
+                "FROM outbox o, json_each(o.actas) a WHERE o.estado IN ('enviado', 'omitido', 'fallido')"
+                + condition.replace('particion', 'o.particion').replace('actualizado', 'o.actualizado') +
+                " AND NOT EXISTS (SELECT 1 FROM notificaciones n WHERE n.acta = a.value AND n.aviso = o.aviso "
+                "AND n.tipo = o.canal AND n.destinatario = o.destinatario)", params).fetchall()
+        return [(str(acta), {'aviso': aviso, 'canal': canal, 'destinatario': destinatario, 'estado': estado,
+                             'ultimo_error': ultimo_error})
+                for acta, aviso, canal, destinatario, estado, ultimo_error in rows]
+
+    def next_retry_time(self, shards=None):
+        self.flush()
+        condition, params = self._shard_filter(shards)
+        with self._lock:
+            row = self.conn.execute("SELECT MIN(proximo_intento) FROM outbox WHERE estado = 'pendiente'" + condition,
+                                    params).fetchone()
+        return row[0]
+
+    def stats(self):
+        with self._lock:
+            return dict(self.conn.execute('SELECT estado, COUNT(*) FROM outbox GROUP BY estado').fetchall())
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self.conn.close()
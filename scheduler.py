@@ -0,0 +1,93 @@
+import heapq
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+
+class DueScheduler:
+    def __init__(self, engine, fire_time='09:00'):
+        self.engine = engine
+        hour, minute = (int(part) for part in fire_time.split(':'))
+        self.fire_offset = timedelta(hours=hour, minutes=minute)
+        # Montículo de (día de aviso, acta, tipo, archivo, generación, posición)
+        self.heap = []
+        # archivo -> (huella, generación, filas con avisos pendientes)
+        self.files = {}
+        self._generation = 0
+
+    def fire_at(self, day):
+        return datetime(1970, 1, 1) + timedelta(days=int(day)) + self.fire_offset
+
+    def fingerprint(self, mdb_file):
+        return self.files[mdb_file][0] if mdb_file in self.files else None
+
+    def update_file(self, mdb_file, fingerprint, frame, since):
+        # Reemplaza los avisos del archivo; las entradas anteriores quedan obsoletas en el montículo
+        self._generation += 1
+        generation = self._generation
+        aviso, mora = self.engine.notification_dates(frame['VENCIMIENTO'])
+        since = np.datetime64(since, 'D')
+        con_deuda = (frame['TOTAL ACTA'] > 0).to_numpy()
+        keep = con_deuda & ((aviso >= since) | (mora >= since))
+        frame = frame.loc[keep].reset_index(drop=True)
+        aviso, mora = aviso[keep], mora[keep]
+        self.files[mdb_file] = (fingerprint, generation, frame)
+
+        actas = frame['ACTA'].astype(str).to_numpy()
+        events = []
+        for fechas, kind in ((aviso, 'vencimiento'), (mora, 'mora')):
+            positions = np.flatnonzero(fechas >= since)
+            days = fechas[positions].astype('int64')
+            events.extend(zip(days.tolist(), actas[positions].tolist(), [kind] * len(positions),
+                              [mdb_file] * len(positions), [generation] * len(positions), positions.tolist()))
+        if len(events) > len(self.heap):
+            self.heap.extend(events)
+            heapq.heapify(self.heap)
+        else:
+            for event in events:
+                heapq.heappush(self.heap, event)
+        self._compact()
+        return len(events)
+
+    def remove_file(self, mdb_file):
+        self.files.pop(mdb_file, None)
+        self._compact()
+
+    def _is_stale(self, event):
+        current = self.files.get(event[3])
+        return current is None or current[1] != event[4]
+
+    def _compact(self):
+        # Si la mayoría de las entradas son obsoletas se reconstruye el montículo
+        live = sum(len(frame) for _, _, frame in self.files.values()) * 2
+        if len(self.heap) > 2 * live + 1024:
+            self.heap = [event for event in self.heap if not self._is_stale(event)]
+            heapq.heapify(self.heap)
+
+    def next_fire(self):
+        while self.heap and self._is_stale(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.fire_at(self.heap[0][0]) if self.heap else None
+
+    def pop_due(self, now=None):
+        # Saca del montículo todos los avisos cuya hora ya pasó y devuelve sus filas
+        now = now or datetime.now()
+        selected = {}
+        while True:
+            next_fire = self.next_fire()
+            if next_fire is None or next_fire > now:
+                break
+            day, _, kind, mdb_file, _, position = heapq.heappop(self.heap)
+            selected.setdefault((mdb_file, kind), []).append((position, day))
+
+        frames = []
+        for (mdb_file, kind), items in selected.items():
+            positions, days = zip(*items)
+            rows = self.files[mdb_file][2].iloc[list(positions)].copy()
+            rows['ES_MORA'] = kind == 'mora'
+            rows['FECHA_ENVIO'] = np.array(days, dtype='datetime64[D]')
+            frames.append(rows)
+        if not frames:
+            return None
+        due = pd.concat(frames, ignore_index=True)
+        return due.sort_values(['FECHA_ENVIO', 'ACTA'], kind='stable', ignore_index=True)
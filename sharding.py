@@ -0,0 +1,141 @@
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import numpy as np
+
+from contacts import normalize_cuit
+
+HASH_MULTIPLIER = np.uint64(2654435761)
+
+
+def shard_of(cuits, shards):
+    # Hash multiplicativo (Knuth) del CUIT normalizado: se usan los bits altos del producto de 32 bits
+    # para que la partición no dependa solo de los últimos dígitos. Los CUIT inválidos van a la partición 0.
+    keys = normalize_cuit(cuits).fillna(0).to_numpy(dtype='uint64')
+    hashed = (keys * HASH_MULTIPLIER) & np.uint64(0xFFFFFFFF)
+    return ((hashed * np.uint64(shards)) >> np.uint64(32)).astype('int64')
+
+
+class LeaseManager:
+    def __init__(self, db_file, shards, worker_id=None, ttl=60.0, settle=5.0):
+        self.shards = shards
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.ttl = ttl
+        self.settle = settle
+        self.owned = set()
+        self._joined = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS particiones (
+                particion INTEGER PRIMARY KEY,
+                trabajador TEXT,
+                expira REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS trabajadores (
+                trabajador TEXT PRIMARY KEY,
+                latido REAL NOT NULL
+            );
+        """)
+        self.conn.executemany('INSERT OR IGNORE INTO particiones (particion) VALUES (?)',
+                              [(shard,) for shard in range(shards)])
+
+    def _transaction(self, work):
+        # BEGIN IMMEDIATE toma el bloqueo de escritura: dos procesos no pueden tomar la misma partición
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(time.time())
+                self.conn.execute('COMMIT')
+                return result
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def _mine(self, now):
+        rows = self.conn.execute('SELECT particion FROM particiones WHERE trabajador = ? AND expira >= ?',
+                                 (self.worker_id, now)).fetchall()
+        return {row[0] for row in rows}
+
+    def heartbeat(self):
+        # Renueva las particiones propias; las que vencieron (proceso demorado) ya no se consideran propias
+        def work(now):
+            self.conn.execute('INSERT OR REPLACE INTO trabajadores (trabajador, latido) VALUES (?, ?)',
+                              (self.worker_id, now))
+            mine = self._mine(now)
+            self.conn.execute('UPDATE particiones SET expira = ? WHERE trabajador = ? AND expira >= ?',
+                              (now + self.ttl, self.worker_id, now))
+            return mine
+        self.owned = self._transaction(work)
+        return self.owned
+
+    def join(self):
+        # Antes de tomar particiones por primera vez, el trabajador se anuncia y espera `settle` segundos:
+        # así los que arrancan juntos se ven entre sí y cada uno toma solo su parte
+        self.heartbeat()
+        time.sleep(self.settle)
+        self._joined = True
+
+    def rebalance(self):
+        if not self._joined:
+            self.join()
+
+        # Cada trabajador vivo se queda con a lo sumo ceil(particiones / trabajadores): toma particiones
+        # libres o vencidas (de procesos caídos) y libera las que le sobran. Devuelve (tomadas, liberadas).
+        def work(now):
+            self.conn.execute('INSERT OR REPLACE INTO trabajadores (trabajador, latido) VALUES (?, ?)',
+                              (self.worker_id, now))
+            self.conn.execute('DELETE FROM trabajadores WHERE latido < ?', (now - self.ttl,))
+            live = self.conn.execute('SELECT COUNT(*) FROM trabajadores').fetchone()[0]
+            fair = math.ceil(self.shards / max(1, live))
+            mine = sorted(self._mine(now))
+            acquired, released = set(), set()
+            if len(mine) > fair:
+                released = set(mine[fair:])
+                self.conn.executemany('UPDATE particiones SET trabajador = NULL, expira = 0 WHERE particion = ?',
+                                      [(shard,) for shard in released])
+            elif len(mine) < fair:
+                free = self.conn.execute(
+                    'SELECT particion FROM particiones WHERE trabajador IS NULL OR expira < ? ORDER BY particion LIMIT ?',
+                    (now, fair - len(mine))).fetchall()
+                acquired = {row[0] for row in free}
+                self.conn.executemany('UPDATE particiones SET trabajador = ?, expira = ? WHERE particion = ?',
+                                      [(self.worker_id, now + self.ttl, shard) for shard in acquired])
+            self.conn.execute('UPDATE particiones SET expira = ? WHERE trabajador = ? AND expira >= ?',
+                              (now + self.ttl, self.worker_id, now))
+            return (set(mine) - released) | acquired, acquired, released
+
+        self.owned, acquired, released = self._transaction(work)
+        return acquired, released
+
+    def _run(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"Error al renovar las particiones: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='latido', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        # Libera las particiones para que otro trabajador las tome sin esperar al vencimiento
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        def work(now):
+            self.conn.execute('UPDATE particiones SET trabajador = NULL, expira = 0 WHERE trabajador = ?',
+                              (self.worker_id,))
+            self.conn.execute('DELETE FROM trabajadores WHERE trabajador = ?', (self.worker_id,))
+        self._transaction(work)
+        self.owned = set()
@@ -0,0 +1,94 @@
+import queue
+import smtplib
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate=0):
+        # rate = mensajes por segundo; 0 desactiva el límite
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SMTPPool:
+    def __init__(self, host='smtp.gmail.com', port=587, user=None, password=None,
+                 starttls=True, use_ssl=False, size=1, max_messages=100, rate=0,
+                 timeout=30, smtp_factory=None):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls and not use_ssl
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.smtp_factory = smtp_factory or (smtplib.SMTP_SSL if use_ssl else smtplib.SMTP)
+        self.rate_limiter = RateLimiter(rate)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections_opened = 0
+
+    def _connect(self):
+        server = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        self.connections_opened += 1
+        return [server, 0]
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _discard(self, conn):
+        try:
+            conn[0].quit()
+        except Exception:
+            try:
+                conn[0].close()
+            except Exception:
+                pass
+
+    def send_message(self, msg):
+        self.rate_limiter.wait()
+        with self._slots:
+            conn = self._acquire()
+            try:
+                try:
+                    conn[0].send_message(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # La sesión reutilizada fue cerrada por el servidor: reconectar una vez
+                    self._discard(conn)
+                    conn = self._connect()
+                    conn[0].send_message(msg)
+            except Exception:
+                self._discard(conn)
+                raise
+
+            conn[1] += 1
+            if self.max_messages and conn[1] >= self.max_messages:
+                self._discard(conn)
+            else:
+                self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SnapshotCache:
+    def __init__(self, cache_dir='.cache_mdb', max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(cache_dir, 'indice.json')
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self):
+        # Con varios procesos sobre la misma carpeta cada uno escribe su propio temporal
+        self._replace(self.index_file, self._dump_index)
+
+    def _dump_index(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=1)
+
+    def _replace(self, path, write):
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _key(self, path, variant='completo'):
+        return os.path.abspath(path) + '|' + variant
+
+    def _lookup(self, path, variant='completo', params=None):
+        # Devuelve la entrada vigente o None si el archivo (o la consulta) cambió
+        key = self._key(path, variant)
+        entry = self.index.get(key)
+        if not entry or not os.path.exists(os.path.join(self.cache_dir, entry['archivo'])):
+            return None
+        if entry.get('params') != params:
+            return None
+        stat = os.stat(path)
+        if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry
+        # Mismo tamaño pero otra fecha: comparar contenido antes de re-extraer
+        if entry['size'] == stat.st_size and entry['hash'] == file_hash(path):
+            entry['mtime'] = stat.st_mtime_ns
+            return entry
+        return None
+
+    def load(self, path, variant='completo', params=None):
+        # Devuelve la instantánea vigente de `path` o None si hay que extraerlo
+        with self._lock:
+            entry = self._lookup(path, variant, params)
+            if entry is None:
+                return None
+            try:
+                df = self._load(entry)
+            except Exception as e:
+                print(f"Instantánea inválida para {path}, se vuelve a extraer: {e}")
+                self._remove(self._key(path, variant))
+                self._write_index()
+                return None
+            # El último uso se guarda con la próxima escritura del índice, no en cada lectura
+            entry['ultimo_uso'] = time.time()
+            return df
+
+    def get(self, path, loader, variant='completo', params=None):
+        df = self.load(path, variant, params)
+        if df is None:
+            df = loader(path)
+            self.put(path, df, variant, params)
+        return df
+
+    def put(self, path, df, variant='completo', params=None):
+        with self._lock:
+            stat = os.stat(path)
+            key = self._key(path, variant)
+            self._remove(key)
+            name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+            df = df.reset_index(drop=True)
+            if HAS_PYARROW:
+                try:
+                    archivo = name + '.feather'
+                    self._replace(os.path.join(self.cache_dir, archivo), df.to_feather)
+                except Exception:
+                    archivo = name + '.pkl'
+                    self._replace(os.path.join(self.cache_dir, archivo), df.to_pickle)
+            else:
+                archivo = name + '.pkl'
+                self._replace(os.path.join(self.cache_dir, archivo), df.to_pickle)
+
+            self.index[key] = {
+                'archivo': archivo,
+                'params': params,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'hash': file_hash(path),
+                'bytes': os.path.getsize(os.path.join(self.cache_dir, archivo)),
+                'ultimo_uso': time.time(),
+            }
+            self._evict()
+            self._write_index()
+
+    def _load(self, entry):
+        path = os.path.join(self.cache_dir, entry['archivo'])
+        if entry['archivo'].endswith('.feather'):
+            return pd.read_feather(path)
+        return pd.read_pickle(path)
+
+    def _evict(self):
+        # Elimina las instantáneas usadas hace más tiempo hasta respetar el tamaño máximo
+        total = sum(entry['bytes'] for entry in self.index.values())
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]['ultimo_uso']):
+            if total <= self.max_bytes:
+                break
+            total -= entry['bytes']
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.index.pop(key, None)
+        if entry:
+            try:
+                os.remove(os.path.join(self.cache_dir, entry['archivo']))
+            except OSError:
+                pass
+
+    def invalidate(self, path=None, write=True):
+        with self._lock:
+            if path is None:
+                for key in list(self.index):
+                    self._remove(key)
+            else:
+                prefix = os.path.abspath(path) + '|'
+                for key in [k for k in self.index if k.startswith(prefix)]:
+                    self._remove(key)
+            if write:
+                self._write_index()
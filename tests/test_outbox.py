@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from outbox import Outbox
+
+
+@pytest.fixture
+def system(tmp_path, monkeypatch):
+    # Sistema sin cachés ni métricas, con el registro y la cola en una carpeta temporal
+    monkeypatch.chdir(tmp_path)
+    for name, value in {'CACHE_MDB': '0', 'METRICAS': '0', 'PARTICIONES': '0', 'DB_BACKEND': 'sqlite',
+                        'LEDGER_FILE': str(tmp_path / 'notificaciones.db')}.items():
+        monkeypatch.setenv(name, value)
+    from notification_system import NotificationSystem
+    systems = []
+
+    def create():
+        systems.append(NotificationSystem())
+        return systems[-1]
+    yield create
+    for created in systems:
+        try:
+            created.close()
+        except Exception:
+            pass
+
+
+def count_rows(system, acta, aviso):
+    return system.ledger.conn.execute('SELECT COUNT(*) FROM notificaciones WHERE acta = ? AND aviso = ?',
+                                      (acta, aviso)).fetchone()[0]
+
+
+def test_crash_between_mark_sent_and_ledger_flush(system):
+    first = system()
+    key = first.outbox.enqueue(['101', '102'], 'mora', 'Email', 'empresa@example.com', {'asunto': 'a', 'cuerpo': 'b'})
+    [entry] = first.outbox.claim_ready()
+    first.outbox.mark_sent(entry['clave'])
+    for acta in entry['actas']:
+        first.log_notification('Email', acta, entry['destinatario'], 'Enviado', is_overdue=True)
+    # Caída: el lote del registro no llega a guardarse
+    first.outbox.conn.close()
+    first.ledger.conn.close()
+    first.ledger._pending = []
+
+    # Al crear la cola se registran los envíos terminados que faltan en el registro
+    second = system()
+    second.outbox
+    assert second.ledger.was_notified('101', 'mora')
+    assert second.ledger.was_notified('102', 'mora')
+    second.ledger.flush()
+    assert count_rows(second, '101', 'mora') == 1
+    assert second.outbox.stats() == {'enviado': 1}
+    assert second.outbox.conn.execute('SELECT payload FROM outbox WHERE clave = ?', (key,)).fetchone()[0] == 'null'
+    second.close()
+
+    # Ya registrado: la siguiente corrida no lo vuelve a agregar
+    third = system()
+    third.outbox
+    third.ledger.flush()
+    assert count_rows(third, '101', 'mora') == 1
+
+
+def test_two_connections_never_claim_the_same_entry(tmp_path):
+    db_file = str(tmp_path / 'notificaciones.db')
+    outboxes = [Outbox(db_file), Outbox(db_file)]
+    keys = {outboxes[0].enqueue([str(acta)], 'vencimiento', 'Email', f'{acta}@example.com', {'cuerpo': ''})
+            for acta in range(200)}
+    outboxes[0].flush()
+    claimed = [[], []]
+    start = threading.Barrier(2)
+
+    def claim(index):
+        start.wait()
+        while True:
+            entries = outboxes[index].claim_ready(limit=7, worker=str(index))
+            if not entries:
+                return
+            claimed[index].extend(entry['clave'] for entry in entries)
+
+    threads = [threading.Thread(target=claim, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not set(claimed[0]) & set(claimed[1])
+    assert sorted(claimed[0] + claimed[1]) == sorted(keys)
+    assert outboxes[0].stats() == {'enviando': 200}
+    for outbox in outboxes:
+        outbox.close()
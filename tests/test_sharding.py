@@ -0,0 +1,45 @@
+import time
+
+from sharding import LeaseManager
+
+
+def test_partitions_of_a_stalled_worker_are_taken_over(tmp_path):
+    db_file = str(tmp_path / 'notificaciones.db')
+    first = LeaseManager(db_file, 6, 'uno', ttl=0.5, settle=0)
+    second = LeaseManager(db_file, 6, 'dos', ttl=0.5, settle=0)
+    first.join()
+    second.join()
+
+    first.rebalance()
+    second.rebalance()
+    assert first.owned == {0, 1, 2}
+    assert second.owned == {3, 4, 5}
+
+    # El primero deja de renovar; el segundo sigue con latidos hasta que las particiones vencen
+    deadline = time.time() + 0.8
+    while time.time() < deadline:
+        second.heartbeat()
+        time.sleep(0.1)
+    acquired, released = second.rebalance()
+    assert acquired == {0, 1, 2}
+    assert not released
+    assert second.owned == set(range(6))
+
+    # El proceso demorado ya no las considera propias
+    assert first.heartbeat() == set()
+
+
+def test_stop_releases_partitions_without_waiting(tmp_path):
+    db_file = str(tmp_path / 'notificaciones.db')
+    first = LeaseManager(db_file, 4, 'uno', ttl=60, settle=0)
+    second = LeaseManager(db_file, 4, 'dos', ttl=60, settle=0)
+    first.join()
+    second.join()
+    first.rebalance()
+    second.rebalance()
+    assert first.owned == {0, 1}
+
+    first.stop()
+    acquired, _ = second.rebalance()
+    assert acquired == {0, 1}
+    assert second.owned == {0, 1, 2, 3}
@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class WhatsAppTransport:
+    name = 'base'
+    concurrency = 1
+    unavailable_reason = 'WhatsApp no está disponible'
+
+    def available(self):
+        return True
+
+    def send(self, phone_number, message):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class DisabledTransport(WhatsAppTransport):
+    name = 'desactivado'
+    unavailable_reason = 'El envío por WhatsApp está desactivado'
+
+    def available(self):
+        print("WhatsApp Web está temporalmente suspendido.")
+        return False
+
+
+class PywhatkitTransport(WhatsAppTransport):
+    # Maneja WhatsApp Web desde el navegador: cada mensaje se programa 2 minutos adelante y bloquea
+    name = 'pywhatkit'
+    unavailable_reason = 'WhatsApp Web no está disponible'
+
+    def available(self):
+        try:
+            import psutil
+
+            # Verificar si hay un navegador abierto
+            browser_processes = ['chrome.exe', 'msedge.exe', 'firefox.exe', 'opera.exe']
+            browser_open = False
+
+            for proc in psutil.process_iter(['name']):
+                if any(browser in (proc.info['name'] or '').lower() for browser in browser_processes):
+                    browser_open = True
+                    break
+
+            if not browser_open:
+                print("No se detectó ningún navegador abierto. WhatsApp Web no está disponible.")
+                return False
+
+            # Dar tiempo para que WhatsApp Web esté completamente cargado
+            time.sleep(5)
+
+            print("Se detectó navegador abierto. Asumiendo que WhatsApp Web está disponible.")
+            return True
+
+        except Exception as e:
+            print(f"Error al verificar WhatsApp Web: {str(e)}")
+            return False
+
+    def send(self, phone_number, message):
+        import pywhatkit
+        send_time = datetime.now() + timedelta(minutes=2)
+        pywhatkit.sendwhatmsg(phone_number, message, send_time.hour, send_time.minute)
+
+
+class TwilioTransport(WhatsAppTransport):
+    # API de mensajería: cada envío es una solicitud HTTP, se pueden enviar varios en paralelo
+    name = 'twilio'
+    concurrency = 8
+    unavailable_reason = 'Faltan las credenciales de Twilio'
+
+    def __init__(self, account_sid=None, auth_token=None, from_number=None):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self._client = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        return bool(self.account_sid and self.auth_token and self.from_number)
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from twilio.rest import Client
+                self._client = Client(self.account_sid, self.auth_token)
+            return self._client
+
+    def send(self, phone_number, message):
+        self.client().messages.create(from_=f'whatsapp:{self.from_number}', to=f'whatsapp:{phone_number}',
+                                      body=message)
+
+
+class MockTransport(WhatsAppTransport):
+    # Transporte local para pruebas: guarda los mensajes en memoria y, opcionalmente, en un archivo JSONL
+    name = 'mock'
+    concurrency = 8
+
+    def __init__(self, output_file=None, latency=0.0):
+        self.output_file = output_file
+        self.latency = latency
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, phone_number, message):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.sent.append((phone_number, message))
+            if self.output_file:
+                with open(self.output_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                        'telefono': phone_number, 'mensaje': message}, ensure_ascii=False) + '\n')
+
+
+def create_transport(backend='desactivado', **options):
+    if backend == 'pywhatkit':
+        return PywhatkitTransport()
+    if backend == 'twilio':
+        return TwilioTransport(options.get('account_sid'), options.get('auth_token'), options.get('from_number'))
+    if backend == 'mock':
+        return MockTransport(options.get('output_file'), float(options.get('latency') or 0))
+    if backend == 'desactivado':
+        return DisabledTransport()
+    raise ValueError(f"Backend de WhatsApp desconocido: {backend}")